@@ -0,0 +1,49 @@
+# Throughput of analyze_batch by number of worker processes.
+#
+#   python bench/bench_batch.py [documents] [lines per document]
+#
+# Speedup is relative to one worker; on an otherwise idle machine it should
+# grow close to linearly up to the number of physical cores.
+import concurrent.futures
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from kaChing import analyze_batch, analyze_document
+
+DOCUMENT = '\n'.join([
+    'int x = 1',
+    'string name = "kaChing"',
+    'if(balance > limit)',
+    'for (i = 0; i < 10; i++)',
+    'print ("hello") # greeting',
+    'compound_interest(principal, interest_rate, time_period)',
+    '/* quarterly',
+    '   totals */ ktotal(sysSecStatement, sysSecTitle)',
+])
+
+
+def main(documents=2000, lines=40):
+    code = '\n'.join([DOCUMENT] * (lines // 8))
+    codes = [code] * documents
+    assert analyze_batch(codes[:1], concurrent.futures.ThreadPoolExecutor(1))[0]['tokens'] == \
+        analyze_document(code)['tokens']
+
+    workers = 1
+    baseline = None
+    while workers <= (os.cpu_count() or 1):
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            analyze_batch(codes[:workers * 16], executor)  # warm up the workers
+            start = time.perf_counter()
+            analyze_batch(codes, executor, chunk_size=16, timeout=5.0)
+            elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{workers:3d} workers  {elapsed:7.3f}s  {documents / elapsed:9.0f} docs/s  "
+              f"speedup {baseline / elapsed:5.2f}x")
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,67 @@
+# Size and serialization cost of the /analyze response encodings.
+#
+#   python bench/bench_encodings.py [sizes, default 64K 1M]
+#
+# Each corpus is analyzed once. The row JSON through Flask's jsonify, as
+# /analyze used to answer, is the baseline; then the row JSON as json.dumps
+# writes it, the columnar JSON and MessagePack forms, each alone and
+# compressed. Times cover encoding and compression, not the analysis.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import kaChing
+import kaChing_encoding
+from corpus import generate, parse_size
+
+
+def best_time(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def jsonify_baseline(analysis):
+    from flask import Flask, jsonify
+
+    app = Flask(__name__)
+
+    def encode():
+        with app.app_context():
+            return jsonify(analysis.to_json()).get_data()
+    return encode
+
+
+def main(*sizes):
+    media_types = kaChing_encoding.media_types()
+    encodings = [None, *kaChing_encoding.content_encodings()]
+    for size in sizes or ('64K', '1M'):
+        code = generate(parse_size(size), seed=1)
+        analysis = kaChing.analyze_source(code)
+        print(f"{size}: {len(code)} bytes of code, {len(analysis.tokens)} tokens")
+        try:
+            baseline_time, baseline = best_time(jsonify_baseline(analysis))
+        except ImportError:
+            baseline_time, baseline = best_time(lambda: kaChing_encoding.encode(analysis))
+        print(f"  {'jsonify (baseline)':30} {len(baseline):10d} bytes {len(baseline) / len(code):6.2f}x code "
+              f"{baseline_time * 1000:9.1f} ms")
+        for media_type in media_types:
+            for encoding in encodings:
+                def encode():
+                    body = kaChing_encoding.encode(analysis, media_type)
+                    return kaChing_encoding.compress(body, encoding) if encoding else body
+                elapsed, body = best_time(encode)
+                name = kaChing_encoding.variant(media_type, encoding) or 'json'
+                print(f"  {name:30} {len(body):10d} bytes {len(body) / len(code):6.2f}x code "
+                      f"{elapsed * 1000:9.1f} ms  {baseline_time / elapsed:5.1f}x faster")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
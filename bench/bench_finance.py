@@ -0,0 +1,138 @@
+# Batched financial built-ins against a per-record Python loop.
+#
+#   python bench/bench_finance.py [rows, default 1000000] [loans, default 20000]
+#
+# The loop is what evaluating the reserved words one record at a time costs:
+# exact Decimal arithmetic on the written amounts, quantized to cents. Every
+# batched result is checked against it. Simple interest, payroll and the
+# monthly interest of amortization only multiply written amounts (and divide
+# by 12), so they must agree to the cent. Installments go through powers,
+# where float and Decimal may round a value lying within a millionth of a
+# cent of a half differently, so disagreements there are only reported.
+import os
+import sys
+import time
+from decimal import ROUND_HALF_EVEN, Decimal, localcontext
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+import kaChing_finance
+
+CENT = Decimal('0.01')
+
+
+def cents(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_EVEN)
+
+
+def portfolio(rows, seed=1):
+    # Amounts with 2 decimals, rates with 4, quarter hours, as written in
+    # records; the Decimal loop reads them through repr like source text
+    rng = np.random.default_rng(seed)
+    return {
+        'principal': rng.integers(100, 100_000_000, rows) / 100,
+        'rate': rng.integers(1, 1500, rows) / 10_000,
+        'periods': rng.integers(1, 31, rows),
+        'term': rng.choice([12, 36, 60, 120, 180, 360], rows),
+        'hours': rng.integers(0, 240, rows) / 4,
+        'hourly_rate': rng.integers(1000, 15000, rows) / 100,
+        'benefits': rng.integers(0, 20000, rows) / 100,
+    }
+
+
+def decimals(values):
+    return [Decimal(repr(float(value))) for value in values]
+
+
+def loop_simple_interest(principal, rate, periods):
+    return [cents(p * r * n) for p, r, n in zip(principal, rate, periods)]
+
+
+def loop_installment(principal, rate, term):
+    out = []
+    for p, r, n in zip(principal, rate, term):
+        monthly = r / 12
+        out.append(cents(p * monthly / (1 - (1 + monthly) ** -n)))
+    return out
+
+
+def loop_amortization(principal, rate, term):
+    out = []
+    for p, r, n in zip(principal, rate, term):
+        monthly = r / 12
+        payment = cents(p * monthly / (1 - (1 + monthly) ** -n))
+        balance = cents(p)
+        total_interest = Decimal(0)
+        for month in range(n):
+            interest = cents(balance * r / 12)
+            due = balance + interest if month == n - 1 else min(payment, balance + interest)
+            balance -= due - interest
+            total_interest += interest
+        out.append(cents(p) + total_interest)
+    return out
+
+
+def loop_payroll(hours, hourly_rate, benefits, brackets=kaChing_finance.DEFAULT_TAX_BRACKETS):
+    brackets = [(Decimal(repr(lower)), Decimal(repr(rate))) for lower, rate in brackets]
+    bounds = [lower for lower, _ in brackets[1:]] + [None]
+    out = []
+    for h, wage, benefit in zip(hours, hourly_rate, benefits):
+        earnings = cents(min(h, 40) * wage) + cents(max(h - 40, 0) * wage * Decimal('1.5'))
+        tax = Decimal(0)
+        for (lower, marginal_rate), upper in zip(brackets, bounds):
+            taxed = earnings - lower if upper is None else min(earnings, upper) - lower
+            tax += max(taxed, 0) * marginal_rate
+        out.append(earnings - cents(tax) - cents(benefit))
+    return out
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def compare(name, rows, batched, loop, exact):
+    batched_time, batched_result = timed(batched)
+    loop_time, loop_result = timed(loop)
+    expected = np.array([int(value * 100) for value in loop_result], dtype=np.int64)
+    got = kaChing_finance.round_cents(batched_result)
+    differ = int(np.count_nonzero(got != expected))
+    worst = int(np.abs(got - expected).max(initial=0))
+    print(f"  {name:20} {rows:9d} rows  loop {loop_time:8.2f} s {rows / loop_time:11.0f} rows/s  "
+          f"batched {batched_time:7.3f} s {rows / batched_time:12.0f} rows/s  "
+          f"{loop_time / batched_time:6.1f}x  {differ} differ (max {worst} cents)")
+    return differ == 0 or not exact
+
+
+def main(rows='1000000', loans='20000'):
+    rows, loans = int(rows), int(loans)
+    data = portfolio(rows)
+    with localcontext() as context:
+        context.prec = 34
+        exact = {name: decimals(values) for name, values in data.items()}
+        ok = compare('simple_interest', rows,
+                     lambda: kaChing_finance.simple_interest(data['principal'], data['rate'], data['periods']),
+                     lambda: loop_simple_interest(exact['principal'], exact['rate'], data['periods'].tolist()),
+                     exact=True)
+        ok &= compare('payroll net_pay', rows,
+                      lambda: kaChing_finance.payroll(data['hours'], data['hourly_rate'], data['benefits'])['net_pay'],
+                      lambda: loop_payroll(exact['hours'], exact['hourly_rate'], exact['benefits']),
+                      exact=True)
+        ok &= compare('installment_amount', rows,
+                      lambda: kaChing_finance.installment_amount(data['principal'], data['rate'], data['term']),
+                      lambda: loop_installment(exact['principal'], exact['rate'], data['term'].tolist()),
+                      exact=False)
+        ok &= compare('total_payment', loans,
+                      lambda: kaChing_finance.total_payment(data['principal'][:loans], data['rate'][:loans],
+                                                            data['term'][:loans]),
+                      lambda: loop_amortization(exact['principal'][:loans], exact['rate'][:loans],
+                                                data['term'][:loans].tolist()),
+                      exact=True)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
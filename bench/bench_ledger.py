@@ -0,0 +1,108 @@
+# Throughput and recovery time of the columnar ledger against a per-record
+# Python loop over a dict of accounts.
+#
+#   python bench/bench_ledger.py [transfers, default 5000000] [accounts, default 100000] [batch, default 100000]
+#
+# Both sides post the same random transfers under the same rules (balances
+# as of the start of each batch, debits of an account taken in order until
+# one is not covered), and their final balances must match to the cent. The
+# ledger runs in memory and then again with its log in a temporary
+# directory, after which the directory is opened again to time recovery from
+# the snapshot and log.
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+from kaChing_ledger import Ledger
+
+OPENING_CENTS = 100_000
+
+
+def batches(transfers, accounts, batch, seed=1):
+    rng = np.random.default_rng(seed)
+    for start in range(0, transfers, batch):
+        size = min(batch, transfers - start)
+        yield (rng.integers(1, accounts + 1, size), rng.integers(1, accounts + 1, size),
+               rng.integers(1, 2 * OPENING_CENTS // 10, size) / 100)
+
+
+def loop_ledger(transfers, accounts, batch):
+    balances = {number: OPENING_CENTS for number in range(1, accounts + 1)}
+    accepted = 0
+    for sources, targets, amounts in batches(transfers, accounts, batch):
+        start = {}
+        debited = {}
+        for source, target, amount in zip(sources.tolist(), targets.tolist(), amounts.tolist()):
+            cents = round(amount * 100)
+            if source == target:
+                continue
+            for number in (source, target):
+                if number not in start:
+                    start[number] = balances[number]
+            if debited.get(source, 0) < 0:
+                continue
+            total = debited.get(source, 0) + cents
+            if total > start[source]:
+                debited[source] = -1
+                continue
+            debited[source] = total
+            balances[source] -= cents
+            balances[target] += cents
+            accepted += 1
+    return balances, accepted
+
+
+def columnar_ledger(transfers, accounts, batch, directory=None):
+    ledger = Ledger('bench', 0, directory)
+    numbers = np.arange(1, accounts + 1)
+    ledger.open_accounts(numbers, ['holder'] * accounts, ['checking'] * accounts, OPENING_CENTS / 100)
+    accepted = 0
+    for sources, targets, amounts in batches(transfers, accounts, batch):
+        accepted += int(ledger.transfer(sources, targets, amounts).sum())
+    ledger.close_log()
+    return ledger, accepted
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main(transfers='5000000', accounts='100000', batch='100000'):
+    transfers, accounts, batch = int(transfers), int(accounts), int(batch)
+    print(f"{transfers} transfers between {accounts} accounts, batches of {batch}")
+    loop_time, (expected, loop_accepted) = timed(lambda: loop_ledger(transfers, accounts, batch))
+    print(f"  {'per-record loop':18} {loop_time:8.2f} s {transfers / loop_time:12.0f} transfers/s "
+          f"({loop_accepted} accepted)")
+    expected = np.array([expected[number] for number in range(1, accounts + 1)], dtype=np.int64)
+    status = 0
+    directory = tempfile.mkdtemp(prefix='kaching-ledger-')
+    try:
+        for label, path in (('ledger, in memory', None), ('ledger, with log', directory)):
+            elapsed, (ledger, accepted) = timed(lambda: columnar_ledger(transfers, accounts, batch, path))
+            same = accepted == loop_accepted and (ledger.balance(np.arange(1, accounts + 1)) * 100).round().astype(
+                np.int64).tolist() == expected.tolist()
+            status = status or (0 if same else 1)
+            print(f"  {label:18} {elapsed:8.2f} s {transfers / elapsed:12.0f} transfers/s "
+                  f"{loop_time / elapsed:6.1f}x  {'same balances' if same else 'DIFFERENT balances'}")
+        log_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        recovery_time, recovered = timed(lambda: Ledger(directory=directory))
+        recovered.close_log()
+        same = recovered.balances[:recovered.count].tolist() == expected.tolist()
+        status = status or (0 if same else 1)
+        print(f"  {'recovery':18} {recovery_time:8.2f} s from {log_bytes} bytes on disk  "
+              f"{'same balances' if same else 'DIFFERENT balances'}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
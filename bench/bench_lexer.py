@@ -0,0 +1,70 @@
+# Throughput of tokenize_line against the old per-lexeme TOKEN_TYPES loop.
+#
+#   python bench/bench_lexer.py [repeat]
+#
+# Both paths run over the same synthetic lines and must agree token for token.
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from kaChing import LEXEME_REGEX, TOKEN_TYPES, tokenize_line
+
+SAMPLE_LINES = [
+    'int x = 1',
+    'string name = "ka\\"Ching"',
+    'float rate = 12 # monthly',
+    'if(balance > limit)',
+    'for (i = 0; i < 10; i++)',
+    'while(count <= total)',
+    'print ("hello")',
+    '<% account_balance %>',
+    'ksub(sysSecStatement, subIndex, subLabel, subList)',
+    'compound_interest(principal, interest_rate, time_period)',
+    'total += installment_amount * loan_term',
+    'else{',
+]
+
+
+def legacy_tokenize_line(line):
+    code_tokens = []
+    comment_token = None
+    for match in re.finditer(LEXEME_REGEX, line):
+        word = match.group()
+        if word.startswith("#"):
+            comment_token = ('SINGLE_LINE_COMMENT', word)
+            break
+        for token_type, pattern in TOKEN_TYPES.items():
+            if re.fullmatch(pattern, word):
+                code_tokens.append((token_type, word))
+                break
+        else:
+            code_tokens.append(('UNKNOWN', word))
+    return code_tokens, comment_token
+
+
+def run(tokenizer, lines):
+    start = time.perf_counter()
+    count = 0
+    for line in lines:
+        count += len(tokenizer(line)[0])
+    return time.perf_counter() - start, count
+
+
+def main(repeat=2000):
+    lines = SAMPLE_LINES * repeat
+    for line in SAMPLE_LINES:
+        assert tokenize_line(line) == legacy_tokenize_line(line), line
+
+    legacy_time, tokens = run(legacy_tokenize_line, lines)
+    new_time, _ = run(tokenize_line, lines)
+    print(f"{len(lines)} lines, {tokens} tokens")
+    print(f"legacy  {legacy_time:8.3f}s  {tokens / legacy_time:12.0f} tokens/s")
+    print(f"master  {new_time:8.3f}s  {tokens / new_time:12.0f} tokens/s")
+    print(f"speedup {legacy_time / new_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,51 @@
+# Wall-clock speedup of lexing one large document across processes.
+#
+#   python bench/bench_parallel_lexing.py [size, default 64M] [jobs ..., default 1 2 4 ... CPUs]
+#
+# The document is a corpus.py program, whose /* ... */ comments span lines,
+# so chunk boundaries regularly fall inside a comment. Every parallel token
+# stream is compared with TokenStream.from_source, the sequential baseline,
+# and the run fails on any difference. Speedups are bounded by the cores the
+# machine really has: with more jobs than cores, the extra workers only add
+# the cost of shipping chunks and token arrays between processes.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import kaChing
+from corpus import generate, parse_size
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def same_tokens(stream, expected):
+    return stream.types == expected.types and stream.starts == expected.starts and stream.ends == expected.ends
+
+
+def main(size='64M', *jobs):
+    code = generate(parse_size(size), seed=1)
+    cpus = os.cpu_count() or 1
+    jobs = [int(count) for count in jobs] or sorted({1 << power for power in range(cpus.bit_length())} | {2, cpus})
+    sequential_time, expected = timed(lambda: kaChing.TokenStream.from_source(code))
+    print(f"{size}: {len(code)} code points, {len(expected)} tokens, {cpus} CPUs, "
+          f"chunks of {kaChing.PARALLEL_CHUNK_SIZE} code points")
+    print(f"  {'sequential':12} {sequential_time:8.2f} s")
+    status = 0
+    for count in jobs:
+        elapsed, stream = timed(lambda: kaChing.tokenize_parallel(code, count))
+        identical = same_tokens(stream, expected)
+        status = status or (0 if identical else 1)
+        print(f"  {f'{count} jobs':12} {elapsed:8.2f} s {sequential_time / elapsed:6.2f}x "
+              f"{'identical' if identical else 'DIFFERENT'}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
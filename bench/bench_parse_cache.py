@@ -0,0 +1,38 @@
+# Parse cache: cold parse against loading the cached syntax tree.
+#
+#   python bench/bench_parse_cache.py [sizes, default 64K 1M]
+#
+# For each corpus size, load_tree runs once against an empty cache directory
+# (lex, parse, build the tree and store it) and again against the stored
+# entry. The loaded tree must equal the parsed one.
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import kaChing_ast
+from corpus import generate, parse_size
+
+
+def main(*sizes):
+    for size in sizes or ('64K', '1M'):
+        code = generate(parse_size(size), seed=1)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            start = time.perf_counter()
+            parsed = kaChing_ast.load_tree(code, cache_dir)
+            parse_time = time.perf_counter() - start
+            start = time.perf_counter()
+            loaded = kaChing_ast.load_tree(code, cache_dir)
+            load_time = time.perf_counter() - start
+            stored = os.path.getsize(kaChing_ast.cache_path(code, cache_dir))
+        assert loaded == parsed
+        nodes = sum(1 for _ in parsed.walk()) - 1
+        print(f"{size:>5} {nodes:7d} nodes  parse {parse_time * 1000:8.1f} ms  cached {load_time * 1000:7.1f} ms  "
+              f"({parse_time / load_time:4.1f}x)  {stored / len(code):5.2f} bytes stored per source byte")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
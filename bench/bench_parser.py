@@ -0,0 +1,27 @@
+# Scaling of syntax_analyzer with the number of tokens on a line.
+#
+#   python bench/bench_parser.py
+#
+# A line of repeated declarations never returns early, so every token is
+# visited. Time per token should stay flat as the line grows.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from kaChing import syntax_analyzer, tokenize_line
+
+
+def main(sizes=(1000, 2000, 4000, 8000, 16000)):
+    for size in sizes:
+        tokens, _ = tokenize_line('int total = 1 ; ' * size)
+        start = time.perf_counter()
+        result = syntax_analyzer(tokens)
+        elapsed = time.perf_counter() - start
+        print(f"{len(tokens):8d} tokens  {elapsed * 1000:9.2f} ms  "
+              f"{elapsed / len(tokens) * 1e9:7.1f} ns/token  {result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Memory held by tokenize's list of (token type, lexeme) tuples against the
+# compact TokenStream, and the time to build each.
+#
+#   python bench/bench_token_memory.py [lines]
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from kaChing import tokenize
+
+LINES = [
+    'int x = 1',
+    'string name = "kaChing"',
+    'if(balance > limit)',
+    'for (i = 0; i < 10; i++)',
+    'print ("hello") # greeting',
+    '/* quarterly',
+    '   totals */ compound_interest(principal, interest_rate, time_period)',
+]
+
+
+def measure(source, compact):
+    tracemalloc.start()
+    start = time.perf_counter()
+    tokens = tokenize(source, compact=compact)
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tokens, size, elapsed
+
+
+def main(lines=200000):
+    source = '\n'.join(LINES[i % len(LINES)] + f' {i}' for i in range(lines))
+    tuples, tuple_bytes, tuple_time = measure(source, compact=False)
+    stream, stream_bytes, stream_time = measure(source, compact=True)
+    assert list(stream) == tuples
+    print(f"{len(tuples)} tokens from {len(source)} characters")
+    print(f"tuples  {tuple_bytes / 1e6:8.1f} MB  {tuple_bytes / len(tuples):6.1f} B/token  {tuple_time:6.2f}s")
+    print(f"stream  {stream_bytes / 1e6:8.1f} MB  {stream_bytes / len(stream):6.1f} B/token  {stream_time:6.2f}s")
+    print(f"saving  {tuple_bytes / stream_bytes:8.1f}x")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,74 @@
+# Interpreter-loop benchmark for the kaChing bytecode VM.
+#
+#   python bench/bench_vm.py [loans, default 200]
+#
+# Runs an amortization script (360 monthly steps per loan, a few
+# arithmetic operations per step) on the VM and the same loop written in
+# Python, and reports loop iterations per second for both. The two must
+# agree on the total interest.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from kaChing_vm import compile_program, run_program
+
+SCRIPT = '''
+/* Total interest paid over a book of identical 30-year loans */
+int loans = {loans}
+float total_interest = 0.0
+for (int loan = 0; loan < loans; loan++) {{
+    float balance = 250000.0
+    float monthly_rate = 0.045 / 12
+    float payment = 1266.71
+    int month = 0
+    while (month < 360 && balance > 0) {{
+        float interest = balance * monthly_rate
+        total_interest += interest
+        balance = balance - (payment - interest)
+        month++
+    }}
+}}
+print(total_interest)
+'''
+
+
+def python_version(loans):
+    total_interest = 0.0
+    for loan in range(loans):
+        balance = 250000.0
+        monthly_rate = 0.045 / 12
+        payment = 1266.71
+        month = 0
+        while month < 360 and balance > 0:
+            interest = balance * monthly_rate
+            total_interest += interest
+            balance = balance - (payment - interest)
+            month += 1
+    return total_interest
+
+
+def main(loans=200):
+    source = SCRIPT.format(loans=loans)
+    start = time.perf_counter()
+    program = compile_program(source)
+    compile_time = time.perf_counter() - start
+    printed = []
+    start = time.perf_counter()
+    run_program(program, output=printed.append, max_steps=10 ** 9)
+    vm_time = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = python_version(loans)
+    python_time = time.perf_counter() - start
+    assert abs(float(printed[0]) - expected) <= 1e-6 * abs(expected), (printed, expected)
+
+    iterations = loans * 360
+    print(f"{len(program.code) // 2} instructions, compiled in {compile_time * 1000:.1f} ms")
+    print(f"vm      {vm_time:8.3f}s  {iterations / vm_time:12.0f} iterations/s")
+    print(f"python  {python_time:8.3f}s  {iterations / python_time:12.0f} iterations/s")
+    print(f"vm / python {vm_time / python_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
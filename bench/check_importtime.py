@@ -0,0 +1,60 @@
+# Cold-start check for the library module.
+#
+#   python bench/check_importtime.py [--budget-ms 25] [--runs 5]
+#
+# Runs 'python -X importtime -c "import kaChing"' in fresh interpreters and
+# fails when the cumulative import time of kaChing goes over the budget or
+# when importing it drags in a dependency that should only load on demand.
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Modules that only the server, the GUI, the demo tables or the batch pool need
+LAZY_MODULES = ('flask', 'werkzeug', 'jinja2', 'tabulate', 'tkinter', 'concurrent', 'numpy')
+
+
+def import_times(module):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='kaChing')
+    parser.add_argument('--budget-ms', type=float, default=25.0)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    import_times(args.module)  # write the bytecode cache first
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    cumulative_ms = statistics.median(times[args.module][1] for times in runs) / 1000
+    self_ms = statistics.median(times[args.module][0] for times in runs) / 1000
+    print(f"import {args.module}: {cumulative_ms:.1f} ms cumulative, {self_ms:.1f} ms self "
+          f"(median of {args.runs}, budget {args.budget_ms:.1f} ms)")
+
+    failures = []
+    if cumulative_ms > args.budget_ms:
+        failures.append(f"cumulative import time {cumulative_ms:.1f} ms is over the {args.budget_ms:.1f} ms budget")
+    eager = sorted({name.split('.')[0] for name in runs[0]} & set(LAZY_MODULES))
+    if eager:
+        failures.append(f"importing {args.module} loads {', '.join(eager)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
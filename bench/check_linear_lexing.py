@@ -0,0 +1,103 @@
+# Fuzz and stress checks for the lexer's linear-time guarantee.
+#
+#   python bench/check_linear_lexing.py [fuzz lines, default 50000] [largest size, default 64K]
+#
+# The fuzz pass tokenizes random lines made of quotes, backslashes, comment
+# and data binding delimiters with the generated scanner and with the regex
+# lexer it replaces, and the two must agree on every token and span.
+#
+# The stress pass times the scanner, analyze_source and the syntax tree
+# builder on adversarial lines of doubling length (unclosed strings full of
+# escaped quotes, unclosed groups and blocks) and fails when the time grows
+# faster than the input: the slope of log time against log size has to stay
+# under MAX_SLOPE. The regex lexer's time on the first family is shown for
+# comparison.
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import kaChing
+import kaChing_ast
+from corpus import parse_size
+
+FUZZ_PIECES = ['"', "'", '\\', '\\"', "\\'", '#', '/*', '*/', '<%', '%>', '(', ')', '{', '}', ' ', 'a', 'int',
+               'kadd', '=', '1', ';', ',', 'é', '\t', 'print', 'else']
+
+# Adversarial lines by name, as a function of the number of repeats
+FAMILIES = {
+    'unclosed escaped "': lambda n: '"' + '\\"' * n,
+    "unclosed escaped '": lambda n: "'" + "\\'" * n,
+    'mixed quotes': lambda n: '"\'\\' * n,
+    'closed pairs': lambda n: '"a" ' * n,
+    'open parens': lambda n: 'kadd(' * n,
+    'open loops': lambda n: 'for (while (' * n,
+    'open blocks': lambda n: 'else{ ' * n,
+    'open data binding': lambda n: '<% x ' * n,
+    'comment delimiters': lambda n: '/* */' * n,
+}
+
+MAX_SLOPE = 1.3
+
+
+def fuzz(count, seed=0):
+    rng = random.Random(seed)
+    scanner = kaChing.load_scanner()
+    failures = 0
+    for _ in range(count):
+        line = ''.join(rng.choice(FUZZ_PIECES) for _ in range(rng.randrange(40)))
+        if (scanner.tokenize_line(line) != kaChing.reference_tokenize_line(line)
+                or scanner.line_spans(line, 3) != list(kaChing.reference_line_spans(line, 3))):
+            failures += 1
+            if failures <= 10:
+                print(f"MISMATCH {line!r}")
+    print(f"{count} fuzzed lines, {failures} mismatches")
+    return failures
+
+
+def best_time(function, argument, repeat=3):
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def stress(largest):
+    stages = [('tokenize_line', kaChing.tokenize_line), ('analyze_source', kaChing.analyze_source),
+              ('syntax tree', kaChing_ast.parse)]
+    sizes = []
+    size = largest
+    while size >= 4096 and len(sizes) < 4:
+        sizes.insert(0, size)
+        size //= 2
+    failed = 0
+    for name, family in FAMILIES.items():
+        for stage, function in stages:
+            lines = [family(max(1, size // len(family(1)))) for size in sizes]
+            times = [best_time(function, line) for line in lines]
+            slope = math.log(times[-1] / times[0]) / math.log(len(lines[-1]) / len(lines[0]))
+            verdict = 'ok' if slope < MAX_SLOPE else 'SUPERLINEAR'
+            failed += verdict != 'ok'
+            print(f"{name:20} {stage:15} " + ' '.join(f"{t * 1000:8.2f}" for t in times)
+                  + f" ms  slope {slope:4.2f} {verdict}")
+    line = FAMILIES['unclosed escaped "'](2048)
+    print(f"regex lexer on {len(line)} chars of escaped quotes: "
+          f"{best_time(kaChing.reference_tokenize_line, line, 1) * 1000:.1f} ms, scanner "
+          f"{best_time(kaChing.tokenize_line, line) * 1000:.2f} ms")
+    return failed
+
+
+def main(count='50000', largest='64K'):
+    failures = fuzz(int(count))
+    failures += stress(parse_size(largest))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,54 @@
+# Check the generated scanner against the regex lexer on the benchmark
+# corpus, and time both.
+#
+#   python bench/check_scanner.py [size, default 4M] [--seed N]
+#
+# Every line must tokenize identically. The corpus is extended with lines
+# that exercise the fallback paths (non-ASCII words, single-quoted text,
+# unterminated strings, stray symbols).
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import kaChing
+import kaChing_scanner
+from corpus import generate, parse_size
+
+EXTRA_LINES = [
+    'string s = "a\\\\" + "b\\"c" + "open', "char c = 'x' + 'y", 'été = räte * 3² + ٣',
+    'x = a$b @c ?d `e | f & g . h \\ i', 'int 12abc = _9 # trailing # comment', '€ § ¶ — “quoted”',
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('size', nargs='?', default='4M')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    lines = generate(parse_size(args.size), seed=args.seed).split('\n') + EXTRA_LINES
+    scanner = kaChing.load_scanner()
+    print(f"scanner tables {getattr(scanner, 'tables_path', None) or 'in memory'}")
+
+    failures = list(kaChing_scanner.mismatches(scanner, kaChing.TOKEN_TYPES, kaChing.LEXEME_REGEX, lines))
+    for line, expected, got in failures[:10]:
+        print(f"MISMATCH {line!r}\n  reference {expected}\n  scanner   {got}")
+    print(f"{len(lines)} lines checked, {len(failures)} mismatches")
+
+    timings = {}
+    for name, tokenize_line in (('regex', kaChing.reference_tokenize_line), ('scanner', scanner.tokenize_line)):
+        tokenize_line(lines[0])
+        start = time.perf_counter()
+        tokens = sum(len(tokenize_line(line)[0]) for line in lines)
+        timings[name] = time.perf_counter() - start
+        print(f"{name:8} {timings[name]:8.3f}s  {tokens / timings[name]:12.0f} tokens/s")
+    print(f"speedup  {timings['regex'] / timings['scanner']:8.2f}x")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
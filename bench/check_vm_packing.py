@@ -0,0 +1,60 @@
+# Check the VM's packed two-operand instructions at their limits.
+#
+#   python bench/check_vm_packing.py [variables, default 3000] [condition body lines, default 140000]
+#
+# ADD_SLOT_CONST and LOAD_LOAD pack a slot and a constant or a second slot
+# into one argument word, whose upper operand only has room for
+# PACK_HIGH_LIMIT values. A program with more variables and constants than
+# that has to compile to the plain instructions and compute the same values.
+# CMP_JUMP packs its jump target into PACK_SHIFT bits, so a condition whose
+# body ends past that must be refused with a CompileError, not miscompiled.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import kaChing_vm
+
+
+def many_variables(count):
+    lines = [f"int v{i} = {1000 + i}" for i in range(count)]
+    lines += ["int total = 0", "total += 1", f"total += {-7 * count}", "total++",
+              f"int high = v{count - 1} + v{count - 2}", "int low = v0 + v1",
+              f"int mixed = v0 + v{count - 1}"]
+    program = kaChing_vm.compile_program('\n'.join(lines))
+    slots = dict(zip(program.slot_names, kaChing_vm.run_program(program, output=lambda line: None)))
+    expected = {'total': 2 - 7 * count, 'high': 2000 + 2 * count - 3, 'low': 2001, 'mixed': 2000 + count - 1}
+    got = {name: slots[name] for name in expected}
+    fused = program.code.tolist()[::2].count(kaChing_vm.ADD_SLOT_CONST)
+    print(f"{count} variables, {len(program.constants)} constants: {got} "
+          f"({fused} ADD_SLOT_CONST) {'ok' if got == expected else f'EXPECTED {expected}'}")
+    return got == expected
+
+
+def long_condition(body_lines):
+    code = "int x = 0\nif (x < 1) {\n" + "x = x + 1\n" * body_lines + "}\nprint(x)"
+    start = time.perf_counter()
+    try:
+        program = kaChing_vm.compile_program(code)
+    except kaChing_vm.CompileError as error:
+        print(f"condition over {body_lines} lines refused in {time.perf_counter() - start:.2f} s: {error}")
+        return True
+    words = len(program.code)
+    output = []
+    kaChing_vm.run_program(program, output=output.append)
+    ok = words <= kaChing_vm.PACK_MASK and output == [str(body_lines)]
+    print(f"condition over {body_lines} lines compiled to {words} code words, printed {output} "
+          f"{'ok' if ok else 'MISCOMPILED'}")
+    return ok
+
+
+def main(variables='3000', body_lines='140000'):
+    ok = many_variables(int(variables))
+    ok &= long_condition(int(body_lines))
+    ok &= long_condition(1000)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,90 @@
+# Check the frozenset word classification against the KEYWORDS and
+# RESERVEDWORDS regexes it replaced, and time both.
+#
+#   python bench/check_word_classes.py [corpus size, e.g. 1M]
+#
+# Every word from the word lists, near misses built from them, and every
+# lexeme of a synthetic corpus must classify exactly as the old per-pattern
+# fullmatch loop did. The words where re.match or re.search on the old
+# unanchored RESERVEDWORDS pattern would have disagreed are listed too; the
+# lexer never matched that way, so they are informational.
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import kaChing
+from corpus import generate, parse_size
+
+# The patterns as they stood before the word lists, duplicate included
+OLD_KEYWORDS = (r'\b(int|string|char|float|double|bool|long|if|else|while|scan|break|default|print'
+                r'|false|none|true|and|as|assert|continue|def|del|elif|except|finally|for|from|global|import'
+                r'|in|is|lambda|nonlocal'
+                r'|not|or|pass|raise|return|try|with|yield)\b')
+OLD_RESERVEDWORDS = (r'(kdelete|kremove|kupdate|ksection|ktotal|kadd|ksub|financial_statement|asset|liability|equity|revenues|expenses|gains'
+                     r'|losses|net_income|operating|investing|financing|ocbalance|ccbalance|bank_system|baccount|bafreeze|baclose'
+                     r'|account_number|account_holder|credit|debit|account_balance|brdeposit|brwithdraw|brtransfer|bcpayroll|bcrollout|bcemployee|rate'
+                     r'|overtime|earnings|net_pay|deductions|taxes|benefits|biloan|biinvest|principal|interest_rate|time_period|compound_interest'
+                     r'|simple_interest|return_on_investment|loan_amount|installment_amount|interest_rate|loan_term|total_payment)')
+OLD_TOKEN_TYPES = {**kaChing.TOKEN_TYPES, 'KEYWORDS': OLD_KEYWORDS, 'RESERVEDWORDS': OLD_RESERVEDWORDS}
+
+
+def old_classify(word):
+    for token_type, pattern in OLD_TOKEN_TYPES.items():
+        if re.fullmatch(pattern, word):
+            return token_type
+    return 'UNKNOWN'
+
+
+def near_misses(words):
+    for word in words:
+        yield word
+        yield word + 's'
+        yield word + '_'
+        yield '_' + word
+        yield word[:-1]
+        yield word[1:]
+        yield word.upper()
+        yield word + '1'
+
+
+def main(size='256k'):
+    words = set(near_misses((*kaChing.KEYWORD_LIST, *kaChing.RESERVED_WORD_LIST)))
+    words.update(['', '_', 'x', '1', '12', '12abc', 'été', '٣', 'räte', '+=', '"s"', '<%', '%>'])
+    code = generate(parse_size(size), seed=3)
+    lexeme_pattern = re.compile(kaChing.LEXEME_REGEX)
+    lexemes = [match.group() for line in code.split('\n') for match in lexeme_pattern.finditer(line)]
+    words.update(lexemes)
+
+    mismatches = [(word, old_classify(word), kaChing.classify_lexeme(word)) for word in sorted(words)
+                  if word and old_classify(word) != kaChing.classify_lexeme(word)]
+    for word, old, new in mismatches:
+        print(f"MISMATCH {word!r}: regex {old}, set {new}")
+    print(f"{len(words)} distinct words checked, {len(mismatches)} mismatches")
+
+    loose = sorted(word for word in words if word and re.match(OLD_RESERVEDWORDS, word)
+                   and word not in kaChing.RESERVED_WORD_SET)
+    print(f"{len(loose)} words re.match(RESERVEDWORDS) accepts that are not reserved words, e.g. "
+          + ', '.join(loose[:8]))
+
+    identifiers = [word for word in lexemes if word.isidentifier()]
+    keyword_pattern = re.compile(OLD_KEYWORDS)
+    reserved_pattern = re.compile(OLD_RESERVEDWORDS)
+    start = time.perf_counter()
+    for word in identifiers:
+        keyword_pattern.fullmatch(word) or reserved_pattern.fullmatch(word)
+    regex_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for word in identifiers:
+        word in kaChing.KEYWORD_SET or word in kaChing.RESERVED_WORD_SET
+    set_time = time.perf_counter() - start
+    print(f"{len(identifiers)} identifier lexemes: regex {regex_time:.3f}s, frozenset {set_time:.3f}s "
+          f"({regex_time / set_time:.1f}x)")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,117 @@
+# Synthetic kaChing programs for the benchmark suite.
+#
+#   python bench/corpus.py SIZE [--seed N] [--output FILE]
+#
+# SIZE takes K/M/G suffixes (1K, 64M, 1G). The same seed and size always
+# give the same program, and programs are written in pieces so even 1 GB
+# corpora never sit in memory.
+import argparse
+import os
+import random
+import sys
+
+UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+TYPES = ['int', 'string', 'float', 'double', 'bool', 'long']
+NAMES = ['balance', 'limit', 'total', 'rate_pct', 'count', 'amount', 'fee', 'i', 'payee', 'period']
+FINANCIAL = ['compound_interest', 'simple_interest', 'return_on_investment', 'installment_amount',
+             'total_payment', 'net_pay', 'deductions', 'taxes', 'brtransfer', 'bcpayroll', 'biloan',
+             'account_balance', 'brdeposit', 'brwithdraw']
+RELATIONS = ['<', '>', '<=', '>=', '==', '!=']
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1:] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    for suffix in ('G', 'M', 'K'):
+        if size >= UNITS[suffix] and size % UNITS[suffix] == 0:
+            return f"{size // UNITS[suffix]}{suffix}"
+    return str(size)
+
+
+def _statement(rng):
+    name = rng.choice(NAMES)
+    other = rng.choice(NAMES)
+    kind = rng.randrange(12)
+    if kind == 0:
+        return f'int {name} = {rng.randrange(10000)}'
+    if kind == 1:
+        return f'string {name} = "memo {rng.randrange(1000)}"'
+    if kind == 2:
+        return f'{rng.choice(TYPES)} {name}'
+    if kind == 3:
+        return f'if({name} {rng.choice(RELATIONS)} {other})'
+    if kind == 4:
+        return 'else{'
+    if kind == 5:
+        return f'for ({name} = 0; {name} < {rng.randrange(100)}; {name}++)'
+    if kind == 6:
+        return f'while({name} {rng.choice(RELATIONS)} {rng.randrange(100)})'
+    if kind == 7:
+        return f'print ("{name} {rng.randrange(1000)}") # trace'
+    if kind == 8:
+        return f'<% {name} %>'
+    if kind == 9:
+        return f'{rng.choice(FINANCIAL)}({name}, {other}, {rng.randrange(360)})'
+    if kind == 10:
+        return f'{name} += {other} * {rng.randrange(100)}'
+    return f'/* {name} review\n   {other} checked */ {name}++'
+
+
+def iter_program(size, seed=0):
+    # Yield lines of a program of about size bytes (never more)
+    rng = random.Random(seed)
+    written = 0
+    while True:
+        line = _statement(rng) + '\n'
+        if written + len(line) > size:
+            break
+        written += len(line)
+        yield line
+
+
+def generate(size, seed=0):
+    return ''.join(iter_program(size, seed))
+
+
+def write_corpus(path, size, seed=0):
+    with open(path, 'w') as file:
+        buffer = []
+        for line in iter_program(size, seed):
+            buffer.append(line)
+            if len(buffer) >= 4096:
+                file.write(''.join(buffer))
+                buffer.clear()
+        file.write(''.join(buffer))
+    return path
+
+
+def corpus_path(directory, size, seed=0):
+    # Generate the corpus file once and reuse it on later runs
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'corpus-{format_size(size)}-{seed}.kc')
+    if not os.path.exists(path):
+        write_corpus(path + '.tmp', size, seed)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('size')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+    if args.output:
+        write_corpus(args.output, parse_size(args.size), args.seed)
+    else:
+        sys.stdout.writelines(iter_program(parse_size(args.size), args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# Load test for the streaming ASGI server.
+#
+#   python bench/load_asgi.py [--clients 200] [--lines 500]
+#   python bench/load_asgi.py --url http://127.0.0.1:8000 [--clients 200]
+#
+# Without --url the app is driven in-process through the ASGI interface, so
+# no server package is needed. With --url the requests go over HTTP to a
+# running 'python kaChing.py serve-async'. Every response must stream one
+# record per line plus the final done record.
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate
+
+
+async def request_in_process(app, body):
+    sent = False
+    chunks = []
+    first_byte = None
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await asyncio.Event().wait()  # the client never disconnects
+
+    async def send(message):
+        nonlocal first_byte
+        if message['type'] == 'http.response.start':
+            status[0] = message['status']
+        elif message.get('body'):
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            chunks.append(message['body'])
+
+    status = [None]
+    scope = {'type': 'http', 'method': 'POST', 'path': '/analyze/stream',
+             'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]}
+    await app(scope, receive, send)
+    return status[0], b''.join(chunks), first_byte, time.perf_counter() - start
+
+
+async def request_http(url, body):
+    parsed = urllib.parse.urlsplit(url)
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(parsed.hostname, parsed.port or 80)
+    writer.write(b'POST /analyze/stream HTTP/1.1\r\nHost: ' + parsed.netloc.encode() +
+                 b'\r\nContent-Type: application/json\r\nConnection: close\r\nContent-Length: ' +
+                 str(len(body)).encode() + b'\r\n\r\n' + body)
+    await writer.drain()
+    first = await reader.read(1)
+    first_byte = time.perf_counter() - start
+    raw = first + await reader.read()
+    writer.close()
+    head, _, payload = raw.partition(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    if b'transfer-encoding: chunked' in head.lower():
+        decoded = []
+        while payload:
+            size_line, _, rest = payload.partition(b'\r\n')
+            size = int(size_line.split(b';')[0], 16)
+            if size == 0:
+                break
+            decoded.append(rest[:size])
+            payload = rest[size + 2:]
+        payload = b''.join(decoded)
+    return status, payload, first_byte, time.perf_counter() - start
+
+
+async def run(args):
+    code = generate(args.lines * 24, seed=1)
+    line_count = len(code.split('\n'))
+    body = json.dumps({'code': code}).encode()
+    if args.url:
+        call = lambda: request_http(args.url, body)
+    else:
+        from kaChing_asgi import StreamingAnalyzerApp
+        app = StreamingAnalyzerApp()
+        call = lambda: request_in_process(app, body)
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(call() for _ in range(args.clients)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    failures = 0
+    first_bytes, latencies = [], []
+    for response in responses:
+        if isinstance(response, Exception):
+            failures += 1
+            continue
+        status, payload, first_byte, latency = response
+        records = [json.loads(line) for line in payload.splitlines()]
+        if status != 200 or len(records) != line_count + 1 or not records[-1].get('done'):
+            failures += 1
+            continue
+        first_bytes.append(first_byte)
+        latencies.append(latency)
+
+    def percentile(values, fraction):
+        return sorted(values)[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+    print(f"{args.clients} clients x {line_count} lines in {elapsed:.2f}s, {failures} failed")
+    print(f"first byte  p50 {statistics.median(first_bytes or [float('nan')]) * 1000:8.1f} ms  "
+          f"p99 {percentile(first_bytes, 0.99) * 1000:8.1f} ms")
+    print(f"complete    p50 {statistics.median(latencies or [float('nan')]) * 1000:8.1f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:8.1f} ms")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--lines', type=int, default=500)
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+# Benchmark suite for the lexer, the parser and the /analyze handler.
+#
+#   python bench/run.py [--sizes 1K,64K,1M] [--repeat 5] [--output results.json]
+#                       [--baseline bench/baseline.json] [--tolerance 0.25]
+#                       [--save-baseline]
+#
+# Corpora come from bench/corpus.py and are cached under bench/.corpus. Each
+# benchmark reports the best of --repeat runs. With --baseline, a benchmark
+# that got slower than the stored time by more than --tolerance fails the run.
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, BENCH_DIR)
+
+import kaChing
+from corpus import corpus_path, format_size, parse_size
+
+# Above these sizes whole-string tokenize switches to tokenize_file, and the
+# HTTP benchmark is skipped, so a 1 GB corpus never has to fit in memory
+IN_MEMORY_LIMIT = 64 << 20
+HTTP_LIMIT = 4 << 20
+
+
+def bench_tokenize(path, size):
+    if size > IN_MEMORY_LIMIT:
+        start = time.perf_counter()
+        count = sum(1 for _ in kaChing.tokenize_file(path))
+        return count, time.perf_counter() - start
+    with open(path) as file:
+        source = file.read()
+    start = time.perf_counter()
+    count = len(kaChing.tokenize(source))
+    return count, time.perf_counter() - start
+
+
+def bench_tokenize_line(path, size):
+    with open(path) as file:
+        start = time.perf_counter()
+        count = 0
+        for line in file:
+            count += len(kaChing.tokenize_line(line.rstrip('\n'))[0])
+    return count, time.perf_counter() - start
+
+
+def bench_syntax_analyzer(path, size):
+    # Lex a bounded window of lines first so only the parser is timed
+    elapsed = 0.0
+    count = 0
+    with open(path) as file:
+        while True:
+            lines = file.readlines(1 << 20)
+            if not lines:
+                break
+            line_tokens = [kaChing.tokenize_line(line.rstrip('\n'))[0] for line in lines]
+            start = time.perf_counter()
+            for tokens in line_tokens:
+                kaChing.syntax_analyzer(tokens)
+            elapsed += time.perf_counter() - start
+            count += len(lines)
+    return count, elapsed
+
+
+def bench_http_analyze(path, size):
+    from kaChing_server import analyze_cache, app
+
+    with open(path) as file:
+        payload = {'code': file.read()}
+    client = app.test_client()
+    # Time the analysis itself, not a cache hit from the warm-up run
+    analyze_cache.clear()
+    start = time.perf_counter()
+    response = client.post('/analyze', json=payload)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.status_code
+    return len(response.get_json()['tokens']), elapsed
+
+
+BENCHMARKS = {
+    'tokenize': bench_tokenize,
+    'tokenize_line': bench_tokenize_line,
+    'syntax_analyzer': bench_syntax_analyzer,
+    'http_analyze': bench_http_analyze,
+}
+
+
+def run_benchmark(name, path, size, repeat):
+    best = None
+    if size <= IN_MEMORY_LIMIT:
+        BENCHMARKS[name](path, size)  # warm up caches before timing
+    for _ in range(repeat):
+        items, elapsed = BENCHMARKS[name](path, size)
+        best = elapsed if best is None else min(best, elapsed)
+    actual_size = os.path.getsize(path)
+    return {
+        'benchmark': name,
+        'size': format_size(size),
+        'bytes': actual_size,
+        'items': items,
+        'seconds': best,
+        'mb_per_s': actual_size / best / 1e6 if best else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    stored = {(entry['benchmark'], entry['size']): entry for entry in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        previous = stored.get((result['benchmark'], result['size']))
+        if previous is None:
+            result['ratio'] = None
+            continue
+        result['ratio'] = result['seconds'] / previous['seconds']
+        if result['ratio'] > 1 + tolerance:
+            regressions.append(result)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1K,64K,1M')
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--corpus-dir', default=os.path.join(BENCH_DIR, '.corpus'))
+    parser.add_argument('--output')
+    parser.add_argument('--baseline', default=os.path.join(BENCH_DIR, 'baseline.json'))
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in map(parse_size, args.sizes.split(',')):
+        path = corpus_path(args.corpus_dir, size, args.seed)
+        for name in args.benchmarks.split(','):
+            if name == 'http_analyze' and size > HTTP_LIMIT:
+                continue
+            if name == 'http_analyze':
+                try:
+                    import flask  # noqa: F401
+                except ImportError:
+                    print("skipping http_analyze: Flask is not installed", file=sys.stderr)
+                    continue
+            results.append(run_benchmark(name, path, size, args.repeat))
+
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+
+    for result in results:
+        ratio = result.get('ratio')
+        print(f"{result['benchmark']:16s} {result['size']:>5s}  {result['seconds']:9.4f}s  "
+              f"{result['mb_per_s']:8.2f} MB/s  {result['items']:>10d} items"
+              + (f"  {ratio:5.2f}x baseline" if ratio else ''))
+
+    report = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    for result in regressions:
+        print(f"REGRESSION: {result['benchmark']} at {result['size']} is {result['ratio']:.2f}x the baseline time")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+
+from kaChing import analyze_lines
+
+# POST /analyze/stream takes {"code": ...} (or the code itself as text/plain)
+# and answers with newline-delimited JSON: one record per line as soon as its
+# run of lines has been analyzed, then a final {"done": true, ...} record.
+# The lexer and parser run on a process pool, so the event loop only moves
+# bytes and stays responsive while large documents are analyzed.
+#
+#   uvicorn kaChing_asgi:app
+#   python kaChing.py serve-async
+
+MAX_BODY_BYTES = int(os.environ.get('KACHING_ASGI_MAX_BODY', 16 << 20))
+BATCH_LINES = int(os.environ.get('KACHING_ASGI_BATCH_LINES', 256))
+QUEUE_BATCHES = int(os.environ.get('KACHING_ASGI_QUEUE_BATCHES', 4))
+MAX_CONCURRENT_ANALYSES = int(os.environ.get('KACHING_ASGI_MAX_CONCURRENCY', 64))
+WORKERS = int(os.environ.get('KACHING_ASGI_WORKERS', os.cpu_count() or 1))
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+def encode_batch(lines, first_line, in_multi_line_comment):
+    # Runs in a worker process: analyze a run of lines and encode the records
+    # there too, so the event loop only has bytes to send
+    records, in_multi_line_comment = analyze_lines(lines, first_line, in_multi_line_comment)
+    body = ''.join(json.dumps(record) + '\n' for record in records).encode()
+    return body, in_multi_line_comment
+
+
+class StreamingAnalyzerApp:
+    def __init__(self, max_body_bytes=MAX_BODY_BYTES, batch_lines=BATCH_LINES, queue_batches=QUEUE_BATCHES,
+                 max_concurrent_analyses=MAX_CONCURRENT_ANALYSES, workers=WORKERS, executor=None):
+        self.max_body_bytes = max_body_bytes
+        self.batch_lines = batch_lines
+        self.queue_batches = queue_batches
+        self.max_concurrent_analyses = max_concurrent_analyses
+        self.workers = workers
+        self.executor = executor
+        self.semaphore = None
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            if scope['path'] == '/analyze/stream' and scope['method'] == 'POST':
+                await self.analyze_stream(scope, receive, send)
+            elif scope['path'] == '/health':
+                await send_json(send, 200, {'status': 'ok'})
+            else:
+                await send_json(send, 404, {'error': f"No route for {scope['method']} {scope['path']}"})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.get_executor()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.executor is not None:
+                    self.executor.shutdown(cancel_futures=True)
+                    self.executor = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, scope, receive):
+        for name, value in scope.get('headers', []):
+            if name == b'content-length':
+                try:
+                    length = int(value)
+                except ValueError:
+                    raise BadRequest(f"Invalid Content-Length {value.decode('latin-1')!r}") from None
+                if length > self.max_body_bytes:
+                    raise RequestTooLarge()
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise RequestTooLarge()
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def analyze_stream(self, scope, receive, send):
+        # The semaphore is taken before the body is read, so it bounds the
+        # memory held by request bodies as well as the analyses running
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrent_analyses)
+        async with self.semaphore:
+            try:
+                code = await self.read_code(scope, receive)
+            except RequestTooLarge:
+                await send_json(send, 413, {'error': f"Request body is larger than {self.max_body_bytes} bytes"})
+                return
+            except BadRequest as error:
+                await send_json(send, 400, {'error': str(error)})
+                return
+            if code is None:
+                return
+            await self.stream_analysis(code, receive, send)
+
+    async def read_code(self, scope, receive):
+        # The code of the request, checked before the response starts so a bad
+        # request gets a 400 rather than a broken stream. None when the client
+        # went away.
+        body = await self.read_body(scope, receive)
+        if body is None:
+            return None
+        headers = dict(scope.get('headers', []))
+        try:
+            if headers.get(b'content-type', b'').startswith(b'text/plain'):
+                return body.decode()
+            code = json.loads(body or b'{}').get('code', '')
+        except (UnicodeDecodeError, ValueError, AttributeError) as error:
+            raise BadRequest(f"Invalid request body: {error}") from None
+        if not isinstance(code, str):
+            raise BadRequest("'code' must be a string")
+        return code
+
+    async def stream_analysis(self, code, receive, send):
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/x-ndjson')]})
+        # The producer analyzes runs of lines while the consumer sends
+        # them. The bounded queue stops the producer from running ahead
+        # of a slow client.
+        queue = asyncio.Queue(maxsize=self.queue_batches)
+        producer = asyncio.ensure_future(self.produce(code.split('\n'), queue))
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    return
+                chunk = getter.result()
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            producer.cancel()
+            disconnected.cancel()
+
+    async def produce(self, lines, queue):
+        loop = asyncio.get_running_loop()
+        executor = self.get_executor()
+        in_multi_line_comment = False
+        try:
+            for start in range(0, len(lines), self.batch_lines):
+                chunk, in_multi_line_comment = await loop.run_in_executor(
+                    executor, encode_batch, lines[start:start + self.batch_lines], start + 1, in_multi_line_comment)
+                await queue.put(chunk)
+            await queue.put(json.dumps({'done': True, 'lines': len(lines)}).encode() + b'\n')
+        except Exception as error:
+            await queue.put(json.dumps({'done': True, 'error': f"{type(error).__name__}: {error}"}).encode() + b'\n')
+        await queue.put(None)
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+app = StreamingAnalyzerApp()
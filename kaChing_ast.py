@@ -0,0 +1,540 @@
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from functools import lru_cache
+
+import kaChing
+
+# Syntax tree of a kaChing document, built from the tokens and line results
+# of kaChing.analyze_source. The statement kinds are the ones syntax_analyzer
+# checks: declarations, if/elif/else, for and while loops, print, <% %> data
+# binding and calls of the financial reserved words (kadd, ksub, baccount...).
+# Braces nest statements into the body of the conditional or loop they follow;
+# without braces the next statement is the body. Expressions are kept as
+# tuples of lexemes.
+#
+# load_tree caches trees on disk in CACHE_DIR/ast, marshalled as nested
+# tuples and keyed on the hash of the source and of the parser, so an
+# unchanged file is loaded without lexing or parsing it again.
+
+# Bump when the tree or its encoding changes shape
+AST_FORMAT = 1
+
+# Bump when a change to the lexer, the scanner generator, the parser or the
+# tree builder changes the tree a source gives
+PARSER_VERSION = 1
+
+# Cached trees not used for this many seconds are removed
+CACHE_MAX_AGE = 30 * 24 * 3600
+
+
+class Node:
+    __slots__ = ('line', 'column')
+    # Fields after line and column, in constructor order
+    fields = ()
+
+    def __iter__(self):
+        yield self.line
+        yield self.column
+        for name in self.fields:
+            yield getattr(self, name)
+
+    def __eq__(self, other):
+        # Compared through the flat encoding, so unbalanced braces nesting
+        # thousands deep do not hit the recursion limit
+        return type(self) is type(other) and list(self.record()) == list(other.record()) and \
+            list(map(_record, preorder(self.children()))) == list(map(_record, preorder(other.children())))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(map(repr, self))})"
+
+    def children(self):
+        return getattr(self, 'body', ())
+
+    def record(self):
+        # Type id, line, column and fields, with the body as its length
+        return _record(self)
+
+    def walk(self):
+        # This node and every node below it, depth first
+        yield self
+        yield from preorder(self.children())
+
+    def to_json(self):
+        # The node's fields, with the body as its number of statements
+        record = {'node': type(self).__name__, 'line': self.line, 'column': self.column}
+        for name in self.fields:
+            value = getattr(self, name)
+            record[name] = len(value) if name == 'body' else value
+        return record
+
+
+class Module(Node):
+    # The whole document: its top-level statements and the syntax_analyzer
+    # result of every line
+    __slots__ = fields = ('body', 'results')
+
+    def __init__(self, line, column, body, results):
+        self.line = line
+        self.column = column
+        self.body = body
+        self.results = results
+
+    def diagnostics(self, lines):
+        return kaChing.diagnostics(lines, self.results)
+
+
+class Block(Node):
+    # Braces that do not follow a conditional or a loop
+    __slots__ = fields = ('body',)
+
+    def __init__(self, line, column, body):
+        self.line = line
+        self.column = column
+        self.body = body
+
+
+class Declaration(Node):
+    # int x = 1: value is None without an initializer
+    __slots__ = fields = ('type_name', 'name', 'value')
+
+    def __init__(self, line, column, type_name, name, value):
+        self.line = line
+        self.column = column
+        self.type_name = type_name
+        self.name = name
+        self.value = value
+
+
+class Conditional(Node):
+    # keyword is 'if', 'elif' or 'else if'
+    __slots__ = fields = ('keyword', 'condition', 'body')
+
+    def __init__(self, line, column, keyword, condition, body):
+        self.line = line
+        self.column = column
+        self.keyword = keyword
+        self.condition = condition
+        self.body = body
+
+
+class Else(Node):
+    __slots__ = fields = ('body',)
+
+    def __init__(self, line, column, body):
+        self.line = line
+        self.column = column
+        self.body = body
+
+
+class ForLoop(Node):
+    __slots__ = fields = ('init', 'condition', 'step', 'body')
+
+    def __init__(self, line, column, init, condition, step, body):
+        self.line = line
+        self.column = column
+        self.init = init
+        self.condition = condition
+        self.step = step
+        self.body = body
+
+
+class WhileLoop(Node):
+    __slots__ = fields = ('condition', 'body')
+
+    def __init__(self, line, column, condition, body):
+        self.line = line
+        self.column = column
+        self.condition = condition
+        self.body = body
+
+
+class Print(Node):
+    __slots__ = fields = ('arguments',)
+
+    def __init__(self, line, column, arguments):
+        self.line = line
+        self.column = column
+        self.arguments = arguments
+
+
+class DataBinding(Node):
+    __slots__ = fields = ('expression',)
+
+    def __init__(self, line, column, expression):
+        self.line = line
+        self.column = column
+        self.expression = expression
+
+
+class FinancialCall(Node):
+    # A reserved word called with arguments. parameters names the arguments
+    # for the functions in kaChing.FUNCTION_SIGNATURES and is empty otherwise.
+    __slots__ = fields = ('function', 'arguments', 'parameters')
+
+    def __init__(self, line, column, function, arguments, parameters):
+        self.line = line
+        self.column = column
+        self.function = function
+        self.arguments = arguments
+        self.parameters = parameters
+
+
+NODE_TYPES = [Module, Block, Declaration, Conditional, Else, ForLoop, WhileLoop, Print, DataBinding,
+              FinancialCall]
+NODE_IDS = {node_type: i for i, node_type in enumerate(NODE_TYPES)}
+
+BODY_NODES = frozenset(node_type for node_type in NODE_TYPES if 'body' in node_type.fields)
+
+# Statements that take the following statement or braced block as their body
+HEADERS = (Conditional, Else, ForLoop, WhileLoop)
+
+PARAMETER_NAMES = {name: tuple(parameter for _, parameter in parameters)
+                   for name, parameters in kaChing.FUNCTION_SIGNATURES.values()}
+
+
+# Statement builders get the tokens of one line as (token type, lexeme,
+# line, column, start offset) and the index of the token that selected them,
+# and return the node and the index after its last token.
+
+def _parenthesized(tokens, index):
+    # The tokens between the '(' at index and its matching ')', and the index
+    # after the ')'. An unclosed group runs to the end of the line.
+    if index >= len(tokens) or tokens[index][0] != 'LPAREN':
+        return [], index
+    depth = 0
+    for end in range(index, len(tokens)):
+        token_type = tokens[end][0]
+        if token_type == 'LPAREN':
+            depth += 1
+        elif token_type == 'RPAREN':
+            depth -= 1
+            if not depth:
+                return tokens[index + 1:end], end + 1
+    return tokens[index + 1:], len(tokens)
+
+
+def _split(tokens, separator):
+    # Lexeme tuples of the runs of tokens between separators at depth 0
+    parts = [[]]
+    depth = 0
+    for token in tokens:
+        token_type = token[0]
+        if token_type == separator and not depth:
+            parts.append([])
+            continue
+        if token_type in ('LPAREN', 'LBRACKET'):
+            depth += 1
+        elif token_type in ('RPAREN', 'RBRACKET'):
+            depth -= 1
+        parts[-1].append(token[1])
+    return tuple(map(tuple, parts))
+
+
+def build_declaration(tokens, index):
+    line, column = tokens[index][2:4]
+    type_name = tokens[index][1]
+    index += 1
+    name = None
+    if index < len(tokens) and tokens[index][0] == 'IDENTIFIER':
+        name = tokens[index][1]
+        index += 1
+    value = None
+    if index < len(tokens) and tokens[index][1] == '=':
+        end = index + 1
+        while end < len(tokens) and tokens[end][0] not in ('SEMICOLON', 'LBRACE', 'RBRACE'):
+            end += 1
+        value = tuple(token[1] for token in tokens[index + 1:end])
+        index = end
+    return Declaration(line, column, type_name, name, value), index
+
+
+def build_conditional(tokens, index):
+    line, column = tokens[index][2:4]
+    keyword = tokens[index][1]
+    inner, index = _parenthesized(tokens, index + 1)
+    return Conditional(line, column, keyword, tuple(token[1] for token in inner), []), index
+
+
+def build_else(tokens, index):
+    line, column = tokens[index][2:4]
+    if index + 1 < len(tokens) and tokens[index + 1][:2] == ('KEYWORDS', 'if'):
+        inner, index = _parenthesized(tokens, index + 2)
+        return Conditional(line, column, 'else if', tuple(token[1] for token in inner), []), index
+    return Else(line, column, []), index + 1
+
+
+def build_for(tokens, index):
+    line, column = tokens[index][2:4]
+    inner, index = _parenthesized(tokens, index + 1)
+    init, condition, step = (_split(inner, 'SEMICOLON') + ((), ()))[:3]
+    return ForLoop(line, column, init, condition, step, []), index
+
+
+def build_while(tokens, index):
+    line, column = tokens[index][2:4]
+    inner, index = _parenthesized(tokens, index + 1)
+    return WhileLoop(line, column, tuple(token[1] for token in inner), []), index
+
+
+def build_print(tokens, index):
+    line, column = tokens[index][2:4]
+    inner, index = _parenthesized(tokens, index + 1)
+    return Print(line, column, _split(inner, 'COMMA') if inner else ()), index
+
+
+def build_financial_call(tokens, index):
+    line, column = tokens[index][2:4]
+    function = tokens[index][1]
+    if index + 1 >= len(tokens) or tokens[index + 1][0] != 'LPAREN':
+        return None, index + 1
+    inner, index = _parenthesized(tokens, index + 1)
+    arguments = _split(inner, 'COMMA') if inner else ()
+    return FinancialCall(line, column, function, arguments, PARAMETER_NAMES.get(function, ())), index
+
+
+def _binding_delimiter(tokens, index, first, second):
+    # Whether tokens[index] starts a data binding delimiter. The lexer splits
+    # '<%' and '%>' into two adjacent operator tokens.
+    token = tokens[index]
+    if token[1] == first + second:
+        return 1
+    if (token[1] == first and index + 1 < len(tokens) and tokens[index + 1][1] == second
+            and tokens[index + 1][4] == token[4] + 1):
+        return 2
+    return 0
+
+
+def build_data_binding(tokens, index):
+    line, column = tokens[index][2:4]
+    index += _binding_delimiter(tokens, index, '<', '%')
+    start = index
+    while index < len(tokens):
+        width = _binding_delimiter(tokens, index, '%', '>')
+        if width:
+            return DataBinding(line, column, tuple(token[1] for token in tokens[start:index])), index + width
+        index += 1
+    return DataBinding(line, column, tuple(token[1] for token in tokens[start:])), index
+
+
+# Builders keyed on (token type, lexeme) for keywords and on token type otherwise
+STATEMENT_BUILDERS = {
+    **{('KEYWORDS', keyword): build_declaration for keyword in kaChing.DECLARATION_LITERALS},
+    ('KEYWORDS', 'if'): build_conditional,
+    ('KEYWORDS', 'elif'): build_conditional,
+    ('KEYWORDS', 'else'): build_else,
+    ('KEYWORDS', 'for'): build_for,
+    ('KEYWORDS', 'while'): build_while,
+    ('KEYWORDS', 'print'): build_print,
+    'RESERVEDWORDS': build_financial_call,
+    'DATA_BINDING_START': build_data_binding,
+}
+
+
+def _line_tokens(analysis):
+    # The code tokens of each line of a SourceAnalysis, comments left out,
+    # with lexemes interned so repeated names share one string in the tree
+    # and in its encoding
+    tokens = analysis.tokens
+    source = tokens.source
+    names = kaChing.TOKEN_TYPE_NAMES
+    comment = kaChing.TOKEN_TYPE_IDS['MULTI_LINE_COMMENT']
+    intern = sys.intern
+    lines = [[] for _ in analysis.lines]
+    for type_id, start, end, line, column in zip(tokens.types, tokens.starts, tokens.ends, analysis.token_lines,
+                                                 analysis.token_columns):
+        if type_id != comment:
+            lines[line - 1].append((names[type_id], intern(source[start:end]), line, column, start))
+    return lines
+
+
+def build_tree(analysis):
+    # The Module of a SourceAnalysis
+    module = Module(1, 1, [], analysis.results)
+    bodies = [module.body]
+    # Header waiting for its body: the next '{' or statement
+    pending = None
+    for tokens in _line_tokens(analysis):
+        index = 0
+        while index < len(tokens):
+            token_type, lexeme, line, column, start = tokens[index]
+            if token_type == 'LBRACE':
+                if pending is None:
+                    block = Block(line, column, [])
+                    bodies[-1].append(block)
+                    bodies.append(block.body)
+                else:
+                    bodies.append(pending.body)
+                    pending = None
+                index += 1
+                continue
+            if token_type == 'RBRACE':
+                pending = None
+                if len(bodies) > 1:
+                    bodies.pop()
+                index += 1
+                continue
+            if _binding_delimiter(tokens, index, '<', '%'):
+                build = build_data_binding
+            else:
+                build = STATEMENT_BUILDERS.get((token_type, lexeme)) or STATEMENT_BUILDERS.get(token_type)
+            if build is None:
+                # An expression statement: the body of a pending header
+                pending = None
+                index += 1
+                continue
+            node, index = build(tokens, index)
+            if node is None:
+                continue
+            (pending.body if pending is not None else bodies[-1]).append(node)
+            pending = node if isinstance(node, HEADERS) else None
+    return module
+
+
+def parse(code):
+    return build_tree(kaChing.analyze_source(code))
+
+
+def preorder(body, depth=0):
+    # The nodes of body and below, depth first, without recursion
+    for node, _ in preorder_with_depth(body, depth):
+        yield node
+
+
+def preorder_with_depth(body, depth=0):
+    stack = [iter(body)]
+    while stack:
+        for node in stack[-1]:
+            yield node, depth + len(stack) - 1
+            if getattr(node, 'body', None):
+                stack.append(iter(node.body))
+                break
+        else:
+            stack.pop()
+
+
+def _record(node):
+    values = [NODE_IDS[type(node)], node.line, node.column]
+    for name in node.fields:
+        value = getattr(node, name)
+        values.append(len(value) if name == 'body' else value)
+    return tuple(values)
+
+
+# Encoding: the nodes below the Module in preorder, each as its record, so
+# the data is one flat list however deep the braces nest. The line results
+# are stored once each with a per-line index into them. Interned lexemes are
+# written once and referenced after that, and the marshalled data goes
+# through a fast zlib level.
+
+def dumps(module):
+    messages = {}
+    indexes = array('I', [messages.setdefault(result, len(messages)) for result in module.results])
+    records = list(map(_record, preorder(module.body)))
+    data = marshal.dumps((AST_FORMAT, list(messages), indexes.tobytes(), len(module.body), records))
+    return zlib.compress(data, 1)
+
+
+def loads(data):
+    version, messages, indexes, count, records = marshal.loads(zlib.decompress(data))
+    if version != AST_FORMAT:
+        raise ValueError(f"syntax tree format {version}, expected {AST_FORMAT}")
+    module = Module(1, 1, [], list(map(messages.__getitem__, array('I', indexes))))
+    # Bodies still being filled, with the number of statements they lack
+    stack = [[module.body, count]] if count else []
+    for record in records:
+        node_type = NODE_TYPES[record[0]]
+        if node_type in BODY_NODES:
+            node = node_type(*record[1:-1], [])
+            children = record[-1]
+        else:
+            node = node_type(*record[1:])
+            children = 0
+        frame = stack[-1]
+        frame[0].append(node)
+        frame[1] -= 1
+        if children:
+            stack.append([node.body, children])
+        else:
+            while stack and not stack[-1][1]:
+                stack.pop()
+    if stack:
+        raise ValueError("syntax tree records end inside a body")
+    return module
+
+
+@lru_cache(maxsize=None)
+def parser_version():
+    # Hash of what decides the tree of a source: the version constants and
+    # the token specification the scanner is generated from. The Python
+    # version is included because marshal data is specific to it.
+    import kaChing_scanner
+
+    spec = kaChing_scanner.spec_hash(kaChing.TOKEN_TYPES, kaChing.LEXEME_REGEX, kaChing.KEYWORD_LIST,
+                                     kaChing.RESERVED_WORD_LIST)
+    key = f'{AST_FORMAT} {PARSER_VERSION} {sys.implementation.cache_tag} {spec}'
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def cache_directory(cache_dir=None):
+    return os.path.join(cache_dir or kaChing.CACHE_DIR, 'ast', parser_version()[:16])
+
+
+def cache_path(code, cache_dir=None):
+    key = hashlib.sha256(code.encode('utf-8', 'surrogatepass')).hexdigest()
+    return os.path.join(cache_directory(cache_dir), key[:2], key[2:] + '.ast')
+
+
+_pruned = set()
+
+
+def _prune_unused(directory):
+    # Remove the trees of this parser version not used for CACHE_MAX_AGE,
+    # once per process. The directories of other versions are left alone:
+    # another checkout sharing the cache may still be using them.
+    if directory in _pruned:
+        return
+    _pruned.add(directory)
+    cutoff = time.time() - CACHE_MAX_AGE
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def load_tree(code, cache_dir=None):
+    # The Module of code, read from the parse cache when this parser has
+    # seen the same source before, otherwise parsed and stored there. Only a
+    # cache directory that kaChing.private_directory accepts is used. An
+    # unreadable entry is parsed again; an unwritable cache only costs the
+    # store. Loading an entry marks it used.
+    if kaChing.private_directory(cache_directory(cache_dir)) is None:
+        return parse(code)
+    path = cache_path(code, cache_dir)
+    try:
+        with open(path, 'rb') as file:
+            module = loads(file.read())
+        os.utime(path)
+        return module
+    except (OSError, EOFError, ValueError, TypeError, IndexError, zlib.error):
+        pass
+    module = parse(code)
+    try:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=directory, suffix='.tmp', delete=False) as file:
+            file.write(dumps(module))
+        os.replace(file.name, path)
+        _prune_unused(cache_directory(cache_dir))
+    except OSError:
+        pass
+    return module
@@ -0,0 +1,185 @@
+import concurrent.futures
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class AnalysisCache:
+    # Bounded LRU cache of encoded analysis responses keyed on a hash of the
+    # code, with entries expiring after ttl seconds. get_or_compute coalesces
+    # concurrent misses for the same key: the first caller computes and the
+    # others wait for its result instead of running the analysis again.
+
+    def __init__(self, max_entries=1024, max_bytes=64 << 20, ttl=300.0, clock=time.monotonic, sizeof=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.sizeof = sizeof
+        self.entries = OrderedDict()  # key -> (body, expires at), oldest first
+        self.in_flight = {}  # key -> Future of the body
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = {'capacity': 0, 'expired': 0}
+
+    @staticmethod
+    def key(code):
+        return hashlib.sha256(code.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    @staticmethod
+    def etag(key, variant='', version=''):
+        # Each encoding of a response (see kaChing_encoding) is a variant
+        # with its own tag, and version tells apart the answers of different
+        # parsers for the same code
+        return '"' + '-'.join(part for part in (key[:32], version, variant) if part) + '"'
+
+    def get_or_compute(self, key, compute):
+        # Return the cached body for key, calling compute() on a miss. compute
+        # returns bytes, or anything sizeof measures in bytes; exceptions
+        # reach every waiting caller.
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[1] > self.clock():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self._remove(key, 'expired')
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self.in_flight[key] = concurrent.futures.Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            body = compute()
+        except BaseException as error:
+            with self.lock:
+                del self.in_flight[key]
+            future.set_exception(error)
+            raise
+        with self.lock:
+            del self.in_flight[key]
+            self._store(key, body)
+        future.set_result(body)
+        return body
+
+    def _store(self, key, body):
+        size = self.sizeof(body)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        self.entries[key] = (body, self.clock() + self.ttl)
+        self.size += size
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)), 'capacity')
+
+    def _remove(self, key, reason):
+        body, _ = self.entries.pop(key)
+        self.size -= self.sizeof(body)
+        self.evictions[reason] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'maxEntries': self.max_entries,
+                'maxBytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'inFlight': len(self.in_flight),
+                'evictions': dict(self.evictions),
+                'hitRatio': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+    def render(self):
+        # Prometheus text lines, for kaChing_metrics.render_metrics(extra=...)
+        stats = self.stats()
+        lines = []
+        for name, help_text, kind, value in (
+                ('kaching_analyze_cache_hits_total', 'Cached /analyze responses served.', 'counter', stats['hits']),
+                ('kaching_analyze_cache_misses_total', '/analyze requests that ran the analysis.', 'counter',
+                 stats['misses']),
+                ('kaching_analyze_cache_coalesced_total', '/analyze requests that waited on an identical one.',
+                 'counter', stats['coalesced']),
+                ('kaching_analyze_cache_entries', 'Responses held in the /analyze cache.', 'gauge', stats['entries']),
+                ('kaching_analyze_cache_bytes', 'Bytes held in the /analyze cache.', 'gauge', stats['bytes'])):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        name = 'kaching_analyze_cache_evictions_total'
+        lines += [f"# HELP {name} Entries dropped from the /analyze cache.", f"# TYPE {name} counter"]
+        for reason, value in sorted(stats['evictions'].items()):
+            lines.append(f'{name}{{reason="{reason}"}} {value}')
+        return lines
+
+
+class DocumentStore:
+    # Documents opened through /documents, by id. Holds at most max_documents,
+    # dropping the least recently used one to make room, and forgets a
+    # document nobody has touched for ttl seconds.
+
+    def __init__(self, max_documents=1000, ttl=3600.0, clock=time.monotonic):
+        self.max_documents = max_documents
+        self.ttl = ttl
+        self.clock = clock
+        self.documents = OrderedDict()  # id -> (document, expires at), least recently used first
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, document_id, document):
+        with self.lock:
+            self._expire()
+            self.documents[document_id] = (document, self.clock() + self.ttl)
+            while len(self.documents) > self.max_documents:
+                self.documents.popitem(last=False)
+
+    def get(self, document_id):
+        with self.lock:
+            self._expire()
+            entry = self.documents.get(document_id)
+            if entry is None:
+                return None
+            self.documents[document_id] = (entry[0], self.clock() + self.ttl)
+            self.documents.move_to_end(document_id)
+            return entry[0]
+
+    def replace(self, document_id, document):
+        # Swap in a new version of a document, unless it was closed or
+        # evicted meanwhile. Returns whether it was stored.
+        with self.lock:
+            if document_id not in self.documents:
+                return False
+            self.documents[document_id] = (document, self.clock() + self.ttl)
+            self.documents.move_to_end(document_id)
+            return True
+
+    def pop(self, document_id):
+        with self.lock:
+            entry = self.documents.pop(document_id, None)
+            return None if entry is None else entry[0]
+
+    def _expire(self):
+        # Entries are in order of last use, so the expired ones come first
+        now = self.clock()
+        while self.documents:
+            document_id, (_, expires) = next(iter(self.documents.items()))
+            if expires > now:
+                break
+            del self.documents[document_id]
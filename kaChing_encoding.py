@@ -0,0 +1,94 @@
+import gzip
+import json
+from functools import lru_cache
+
+# Response bodies for /analyze. Besides the row JSON of SourceAnalysis.to_json
+# there is a columnar form, which sends every token as an index into a token
+# type table plus its start and end offsets in the code (in code points), and
+# every line's result as an index into a table of distinct results. The same
+# columnar document can be sent as MessagePack when msgpack is installed.
+# Large bodies are compressed with zstd (when zstandard is installed) or gzip.
+
+JSON_MEDIA_TYPE = 'application/json'
+COLUMNAR_MEDIA_TYPE = 'application/vnd.kaching.columnar+json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+# Short names of the non-default media types, for ETags and cache keys
+VARIANT_NAMES = {COLUMNAR_MEDIA_TYPE: 'columnar', MSGPACK_MEDIA_TYPE: 'msgpack'}
+
+GZIP_LEVEL = 3
+ZSTD_LEVEL = 3
+
+
+@lru_cache(maxsize=None)
+def _optional_module(name):
+    import importlib
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def media_types():
+    # Media types /analyze can answer with, the default first
+    offered = [JSON_MEDIA_TYPE, COLUMNAR_MEDIA_TYPE]
+    if _optional_module('msgpack') is not None:
+        offered.append(MSGPACK_MEDIA_TYPE)
+    return offered
+
+
+def content_encodings():
+    # Compressions /analyze can apply, preferred first
+    if _optional_module('zstandard') is not None:
+        return ['zstd', 'gzip']
+    return ['gzip']
+
+
+def variant(media_type, encoding=None):
+    # Name of a media type and content encoding pair, '' for uncompressed
+    # row JSON
+    return '+'.join(name for name in (VARIANT_NAMES.get(media_type), encoding) if name)
+
+
+def columnar(analysis):
+    # The columnar document of a SourceAnalysis. lineStarts holds the offset
+    # of every line, from which a client finds the line and column of any
+    # token offset.
+    import kaChing
+
+    messages = {}
+    results = [messages.setdefault(result, len(messages)) for result in analysis.results]
+    line_starts = []
+    offset = 0
+    for line in analysis.lines:
+        line_starts.append(offset)
+        offset += len(line) + 1
+    tokens = analysis.tokens
+    return {
+        'format': 'columnar',
+        'tokenTypes': kaChing.TOKEN_TYPE_NAMES,
+        'tokens': {'types': tokens.types.tolist(), 'starts': tokens.starts.tolist(), 'ends': tokens.ends.tolist()},
+        'lineStarts': line_starts,
+        'messages': list(messages),
+        'results': results,
+        'diagnostics': analysis.diagnostics(),
+    }
+
+
+def encode(analysis, media_type=JSON_MEDIA_TYPE):
+    if media_type == JSON_MEDIA_TYPE:
+        return json.dumps(analysis.to_json()).encode()
+    if media_type == COLUMNAR_MEDIA_TYPE:
+        return json.dumps(columnar(analysis), separators=(',', ':')).encode()
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return _optional_module('msgpack').packb(columnar(analysis))
+    raise ValueError(f"Unsupported media type {media_type!r}")
+
+
+def compress(body, encoding):
+    if encoding == 'gzip':
+        # mtime=0 keeps the bytes, and so the cached entry, reproducible
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+    if encoding == 'zstd':
+        return _optional_module('zstandard').ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    raise ValueError(f"Unsupported content encoding {encoding!r}")
@@ -0,0 +1,209 @@
+import numpy as np
+
+# The financial reserved words evaluated over whole portfolios: every
+# function takes NumPy arrays (or anything broadcastable to them) of
+# principals, rates, terms or hours and returns arrays, one entry per record.
+#
+# Money is rounded to cents the way decimal arithmetic on the written amounts
+# would round it. A binary float such as 2.675 is really 2.67499999..., so
+# rounding it directly gives 2.67. Amounts are therefore scaled to cents and
+# snapped to SNAP_DIGITS decimal places first, which removes the
+# representation error and leaves true halves exactly on .5, and only then
+# rounded with ROUNDING. Snapping is exact while amounts stay below
+# MAX_EXACT_AMOUNT; larger amounts are rounded as the floats they are, and
+# amounts from MAX_AMOUNT up (or not finite) are refused, since whole cents
+# are no longer exact there. Schedules and payroll runs are carried in
+# integer cents, so sums of rounded amounts never drift.
+#
+# Rates are fractions per year (0.045 for 4.5%), loan terms are in months.
+
+CENTS = 100
+SNAP_DIGITS = 6
+MAX_EXACT_AMOUNT = 2 ** 53 / (CENTS * 10 ** SNAP_DIGITS)
+MAX_AMOUNT = 2 ** 53 / CENTS
+
+# 'half_even' (banker's rounding) or 'half_up' (halves away from zero)
+ROUNDING = 'half_even'
+
+# Tax per pay period: (lower bound of earnings, marginal rate) in increasing
+# order of bounds
+DEFAULT_TAX_BRACKETS = ((0.0, 0.10), (1000.0, 0.20), (4000.0, 0.30))
+
+
+def round_cents(amounts, rounding=None):
+    # Amounts rounded to whole cents, as int64
+    amounts = np.asarray(amounts, dtype=np.float64)
+    magnitude = np.abs(amounts)
+    if not np.all(magnitude < MAX_AMOUNT):
+        raise ValueError(f"Amounts must be finite and below {MAX_AMOUNT:.0f}")
+    scaled = amounts * CENTS
+    scaled = np.where(magnitude < MAX_EXACT_AMOUNT, np.round(scaled, SNAP_DIGITS), scaled)
+    rounding = rounding or ROUNDING
+    if rounding == 'half_even':
+        cents = np.rint(scaled)
+    elif rounding == 'half_up':
+        cents = np.copysign(np.floor(np.abs(scaled) + 0.5), scaled)
+    else:
+        raise ValueError(f"Unknown rounding {rounding!r}")
+    return cents.astype(np.int64)
+
+
+def to_amounts(cents):
+    return np.asarray(cents) / CENTS
+
+
+def simple_interest(principal, rate, periods, rounding=None):
+    principal, rate, periods = np.broadcast_arrays(principal, rate, periods)
+    return to_amounts(round_cents(principal * rate * periods, rounding))
+
+
+def compound_interest(principal, rate, periods, per_period=1, rounding=None):
+    # Interest earned on principal compounded per_period times per period
+    principal, rate, periods = np.broadcast_arrays(principal, rate, periods)
+    growth = np.power(1 + rate / per_period, periods * per_period)
+    return to_amounts(round_cents(principal * growth - principal, rounding))
+
+
+def return_on_investment(final_value, cost):
+    # (final value - cost) / cost, NaN where the cost is 0
+    final_value, cost = np.broadcast_arrays(np.asarray(final_value, dtype=np.float64), cost)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(cost != 0, (final_value - cost) / cost, np.nan)
+
+
+def _installment_cents(loan_amount, rate, term, rounding):
+    monthly_rate = np.asarray(rate, dtype=np.float64) / 12
+    term = np.asarray(term, dtype=np.float64)
+    if not np.all(term >= 1):
+        raise ValueError("Loan terms must be at least one month")
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = loan_amount * monthly_rate / -np.expm1(-term * np.log1p(monthly_rate))
+    payment = np.where(monthly_rate == 0, loan_amount / term, annuity)
+    return round_cents(payment, rounding)
+
+
+def installment_amount(loan_amount, rate, term, rounding=None):
+    # Level monthly payment that repays loan_amount over term months
+    loan_amount, rate, term = np.broadcast_arrays(loan_amount, rate, term)
+    return to_amounts(_installment_cents(loan_amount, rate, term, rounding))
+
+
+def _amortize(loan_amount, rate, term, rounding, keep_schedule):
+    # Walk all loans month by month in integer cents. Each month's interest
+    # is rounded on its own; the last payment clears whatever balance the
+    # rounded installments leave.
+    loan_amount, rate, term = np.broadcast_arrays(loan_amount, rate, term)
+    term = term.astype(np.int64)
+    payment = _installment_cents(loan_amount, rate, term, rounding)
+    balance = round_cents(loan_amount, rounding)
+    monthly_rate = np.asarray(rate, dtype=np.float64) / 12
+    months = int(term.max(initial=0))
+    total_interest = np.zeros(balance.shape, dtype=np.int64)
+    final_payment = np.zeros(balance.shape, dtype=np.int64)
+    schedule = {name: np.zeros(balance.shape + (months,), dtype=np.int64)
+                for name in ('payment', 'interest', 'principal', 'balance')} if keep_schedule else None
+    for month in range(months):
+        active = month < term
+        last = month == term - 1
+        interest = np.where(active, round_cents(balance / CENTS * monthly_rate, rounding), 0)
+        due = np.where(last, balance + interest, np.minimum(payment, balance + interest))
+        due = np.where(active, due, 0)
+        repaid = due - interest
+        balance = balance - repaid
+        total_interest += interest
+        final_payment = np.where(last, due, final_payment)
+        if keep_schedule:
+            schedule['payment'][..., month] = due
+            schedule['interest'][..., month] = interest
+            schedule['principal'][..., month] = repaid
+            schedule['balance'][..., month] = balance
+    totals = {
+        'installment': payment,
+        'final_payment': final_payment,
+        'total_interest': total_interest,
+        'total_payment': round_cents(loan_amount, rounding) + total_interest,
+    }
+    return totals, schedule
+
+
+def amortization_schedule(loan_amount, rate, term, rounding=None):
+    # Month-by-month payment, interest, principal repaid and balance left of
+    # every loan, each shaped (loans..., longest term); months past a loan's
+    # term are zero. Memory grows with loans times months, so use
+    # amortization_totals for large portfolios.
+    _, schedule = _amortize(loan_amount, rate, term, rounding, keep_schedule=True)
+    return {name: to_amounts(cents) for name, cents in schedule.items()}
+
+
+def amortization_totals(loan_amount, rate, term, rounding=None):
+    # Installment, final payment, total interest and total paid of every
+    # loan, without keeping the schedule
+    totals, _ = _amortize(loan_amount, rate, term, rounding, keep_schedule=False)
+    return {name: to_amounts(cents) for name, cents in totals.items()}
+
+
+def total_payment(loan_amount, rate, term, rounding=None):
+    return amortization_totals(loan_amount, rate, term, rounding)['total_payment']
+
+
+def _tax_cents(earnings_cents, brackets, rounding):
+    earnings = earnings_cents / CENTS
+    tax = np.zeros(np.shape(earnings), dtype=np.float64)
+    bounds = [lower for lower, _ in brackets[1:]] + [np.inf]
+    for (lower, marginal_rate), upper in zip(brackets, bounds):
+        tax += np.clip(earnings - lower, 0, upper - lower) * marginal_rate
+    return round_cents(tax, rounding)
+
+
+def taxes(earnings, brackets=DEFAULT_TAX_BRACKETS, rounding=None):
+    return to_amounts(_tax_cents(round_cents(earnings, rounding), brackets, rounding))
+
+
+def deductions(earnings, benefits=0.0, brackets=DEFAULT_TAX_BRACKETS, rounding=None):
+    earnings, benefits = np.broadcast_arrays(earnings, benefits)
+    return to_amounts(_tax_cents(round_cents(earnings, rounding), brackets, rounding)
+                      + round_cents(benefits, rounding))
+
+
+def net_pay(earnings, benefits=0.0, brackets=DEFAULT_TAX_BRACKETS, rounding=None):
+    earnings, benefits = np.broadcast_arrays(earnings, benefits)
+    earnings_cents = round_cents(earnings, rounding)
+    return to_amounts(earnings_cents - _tax_cents(earnings_cents, brackets, rounding)
+                      - round_cents(benefits, rounding))
+
+
+def payroll(hours, hourly_rate, benefits=0.0, overtime_after=40.0, overtime_multiplier=1.5,
+            brackets=DEFAULT_TAX_BRACKETS, rounding=None):
+    # One pay run over every employee: regular and overtime earnings, taxes,
+    # benefits, total deductions and net pay
+    hours, hourly_rate, benefits = np.broadcast_arrays(hours, hourly_rate, benefits)
+    regular_hours = np.minimum(hours, overtime_after)
+    overtime_hours = np.maximum(hours - overtime_after, 0)
+    regular = round_cents(regular_hours * hourly_rate, rounding)
+    overtime = round_cents(overtime_hours * hourly_rate * overtime_multiplier, rounding)
+    earnings = regular + overtime
+    tax = _tax_cents(earnings, brackets, rounding)
+    benefit = round_cents(benefits, rounding)
+    return {
+        'earnings': to_amounts(earnings),
+        'overtime': to_amounts(overtime),
+        'taxes': to_amounts(tax),
+        'benefits': to_amounts(benefit),
+        'deductions': to_amounts(tax + benefit),
+        'net_pay': to_amounts(earnings - tax - benefit),
+    }
+
+
+# Batched implementations of the reserved words
+RESERVED_WORD_FUNCTIONS = {
+    'simple_interest': simple_interest,
+    'compound_interest': compound_interest,
+    'return_on_investment': return_on_investment,
+    'installment_amount': installment_amount,
+    'total_payment': total_payment,
+    'biloan': amortization_schedule,
+    'bcpayroll': payroll,
+    'taxes': taxes,
+    'deductions': deductions,
+    'net_pay': net_pay,
+}
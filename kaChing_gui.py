@@ -0,0 +1,157 @@
+import os
+import queue
+import threading
+import tkinter as tk
+from tkinter import scrolledtext
+from tkinter import ttk
+
+from kaChing import Document
+
+# Delay after the last keystroke before the text is analyzed again, and how
+# often the worker's results are polled, in milliseconds
+DEBOUNCE_MS = 300
+POLL_MS = 50
+# Treeview rows inserted per turn of the event loop
+INSERT_BATCH = 500
+
+
+class AnalysisWorker:
+    # Keeps a Document up to date on a background thread. submit() hands over
+    # the latest text and returns its generation number. Text queued behind
+    # newer text is dropped, and a run stops building rows as soon as newer
+    # text arrives. Finished runs wait in self.results for the Tk thread.
+
+    def __init__(self):
+        self.document = Document()
+        self.generation = 0
+        self.pending = None
+        self.condition = threading.Condition()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, text):
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, text)
+            self.condition.notify()
+            return self.generation
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                generation, text = self.pending
+                self.pending = None
+            # Only the lines edited since the last run are lexed and parsed
+            # again. The update itself always completes so the Document stays
+            # consistent; a stale run is abandoned while its rows are built.
+            self.document.set_text(text)
+            rows = self.build_rows(generation)
+            if rows is not None:
+                self.results.put((generation, *rows))
+
+    def build_rows(self, generation):
+        lexical_rows = []
+        document = self.document
+        syntax_rows = document.result_rows()
+        for count, (line_number, _, _) in enumerate(syntax_rows):
+            if count % 256 == 0 and generation != self.generation:
+                return None
+            lexical_rows.extend((lexeme, token) for token, lexeme in document.line_tokens(line_number - 1))
+        return lexical_rows, syntax_rows
+
+
+class SyntaxAnalyzerApp:
+    def __init__(self, root):
+        self.root = root
+        self.root.configure(bg="lightblue")
+        self.root.title("Syntax Analyzer")
+
+        icon_img = tk.PhotoImage(file=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kaChing.png'))
+        self.root.iconphoto(True, icon_img)
+
+        # Input Text Widget
+        self.input_text = scrolledtext.ScrolledText(root, width=60, height=10, bg="lightgreen")
+        self.input_text.grid(row=0, column=0, columnspan=2, padx=10, pady=10)
+
+        # Lexical Results
+        self.lexical_results = ttk.Treeview(root, columns=('Lexemes', 'Tokens'))
+        self.lexical_results.heading('Lexemes', text='Lexemes')
+        self.lexical_results.heading('Tokens', text='Tokens')
+        self.lexical_results.grid(row=1, column=0, padx=10, pady=10)
+
+        # Syntax Analyzer Results
+        self.syntax_results = ttk.Treeview(root, columns=('Code', 'Parser Result'))
+        self.syntax_results.heading('#0', text='Line')
+        self.syntax_results.heading('Code', text='Code')
+        self.syntax_results.heading('Parser Result', text='Parser Result')
+        self.syntax_results.grid(row=1, column=1, padx=10, pady=10)
+
+        # Analyze Button
+        self.analyze_button = tk.Button(root, text='Analyze', command=self.analyze_code, bg="lightgreen")
+        self.analyze_button.grid(row=2, column=0, columnspan=2, pady=10)
+
+        # Analysis runs on the worker; typing re-runs it once input pauses
+        self.worker = AnalysisWorker()
+        self.generation = 0
+        self.debounce_job = None
+        self.render_job = None
+        self.input_text.bind('<<Modified>>', self.on_modified)
+        self.root.after(POLL_MS, self.poll_results)
+
+    def on_modified(self, event):
+        if not self.input_text.edit_modified():
+            return
+        self.input_text.edit_modified(False)
+        if self.debounce_job is not None:
+            self.root.after_cancel(self.debounce_job)
+        self.debounce_job = self.root.after(DEBOUNCE_MS, self.analyze_code)
+
+    def analyze_code(self):
+        if self.debounce_job is not None:
+            self.root.after_cancel(self.debounce_job)
+            self.debounce_job = None
+        self.generation = self.worker.submit(self.input_text.get("1.0", tk.END))
+
+    def poll_results(self):
+        try:
+            while True:
+                generation, lexical_rows, syntax_rows = self.worker.results.get_nowait()
+                if generation == self.generation:
+                    self.show_results(generation, lexical_rows, syntax_rows)
+        except queue.Empty:
+            pass
+        self.root.after(POLL_MS, self.poll_results)
+
+    def show_results(self, generation, lexical_rows, syntax_rows):
+        if self.render_job is not None:
+            self.root.after_cancel(self.render_job)
+        self.lexical_results.delete(*self.lexical_results.get_children())
+        self.syntax_results.delete(*self.syntax_results.get_children())
+        self.insert_rows(generation, lexical_rows, syntax_rows, 0)
+
+    def insert_rows(self, generation, lexical_rows, syntax_rows, start):
+        # Insert one batch of rows, then yield to the event loop so the window
+        # keeps responding. Newer results stop an unfinished render.
+        self.render_job = None
+        if generation != self.generation:
+            return
+        stop = start + INSERT_BATCH
+        for lexeme, token in lexical_rows[start:stop]:
+            self.lexical_results.insert('', 'end', values=(lexeme, token))
+        for line_number, line, result in syntax_rows[start:stop]:
+            self.syntax_results.insert('', 'end', text=str(line_number), values=(line, result))
+        if stop < max(len(lexical_rows), len(syntax_rows)):
+            self.render_job = self.root.after(1, self.insert_rows, generation, lexical_rows, syntax_rows, stop)
+
+
+def run_gui():
+    root = tk.Tk()
+    app = SyntaxAnalyzerApp(root)
+    root.mainloop()
+
+
+if __name__ == '__main__':
+    run_gui()
@@ -0,0 +1,466 @@
+import marshal
+import os
+import re
+import struct
+import tempfile
+import zlib
+from functools import partial
+
+import numpy as np
+
+from kaChing_finance import round_cents, to_amounts
+
+# The ledger behind the banking reserved words: bank_system, baccount,
+# bafreeze, baclose, brdeposit, brwithdraw, brtransfer, account_balance and
+# account_holder. Accounts are rows of columnar arrays (number, balance in
+# integer cents, status) plus holder and type lists, found through a hash
+# index on account number that looks up a whole batch with array operations.
+# Deposits, withdrawals and transfers come in batches and are checked and
+# applied with array operations.
+#
+# A batch is checked against the balances the accounts had when it began:
+# debits of one account are taken in batch order until one is not covered,
+# and that one and the account's later debits in the batch are refused.
+# Credits received during the batch count from the next batch on. Money
+# leaving the ledger must also leave its reserve behind: withdrawals are
+# taken in batch order until one would bring the total of all balances below
+# the reserve, and that one and the later ones are refused.
+#
+# A ledger given a directory is durable. Every accepted change is applied and
+# then appended to a log before the operation returns, so a change that fails
+# to apply is never logged. Once the log passes snapshot_bytes the arrays are
+# written to a snapshot and a new log begins. Opening the directory again
+# loads the snapshot and replays its log; a record torn by a crash is cut
+# off. The log is flushed to the OS after every operation, so only an OS
+# crash can lose the most recent records, unless fsync is set.
+
+OPEN, FROZEN, CLOSED = 0, 1, 2
+STATUS_NAMES = ('open', 'frozen', 'closed')
+
+INITIAL_CAPACITY = 1024
+
+# Fibonacci hashing multiplier for the account number index
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+SNAPSHOT_BYTES = 64 << 20
+
+SNAPSHOT_NAME = 'snapshot.npz'
+LOG_HEADER = struct.Struct('<II')
+
+
+class LedgerError(ValueError):
+    pass
+
+
+def _log_name(generation):
+    return f'wal-{generation}.log'
+
+
+class HashIndex:
+    # Open-addressing hash table from int64 keys to rows, with linear
+    # probing, kept at most half full. Inserts and lookups take arrays of
+    # keys and probe all of them at once, one step per round, so a batch
+    # costs a few array operations per probe step rather than one dict
+    # lookup per key.
+    __slots__ = ('keys', 'rows', 'count')
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        size = 1 << max(capacity * 2 - 1, 1).bit_length()
+        self.keys = np.zeros(size, dtype=np.int64)
+        self.rows = np.full(size, -1, dtype=np.int64)
+        self.count = 0
+
+    def _slots(self, keys):
+        mask = np.uint64(len(self.keys) - 1)
+        return (((keys.astype(np.uint64) * HASH_MULTIPLIER) >> np.uint64(32)) & mask).astype(np.int64)
+
+    def insert(self, keys, rows):
+        # Keys must be distinct and not in the table yet
+        if (self.count + len(keys)) * 2 > len(self.keys):
+            old_keys, old_rows = self.keys[self.rows >= 0], self.rows[self.rows >= 0]
+            self.__init__(self.count + len(keys))
+            self._place(old_keys, old_rows)
+        self._place(keys, rows)
+
+    def _place(self, keys, rows):
+        slots = self._slots(keys)
+        pending = np.arange(len(keys))
+        mask = len(self.keys) - 1
+        while len(pending):
+            # Of the keys whose slot is free, the first one for each slot
+            # takes it; every other key moves on to the next slot
+            candidates = pending[self.rows[slots[pending]] < 0]
+            _, first = np.unique(slots[candidates], return_index=True)
+            winners = candidates[first]
+            self.keys[slots[winners]] = keys[winners]
+            self.rows[slots[winners]] = rows[winners]
+            placed = np.zeros(len(keys), dtype=bool)
+            placed[winners] = True
+            pending = pending[~placed[pending]]
+            slots[pending] = (slots[pending] + 1) & mask
+        self.count += len(keys)
+
+    def lookup(self, keys):
+        # Row of every key, -1 for keys not in the table
+        found = np.full(len(keys), -1, dtype=np.int64)
+        slots = self._slots(keys)
+        pending = np.arange(len(keys))
+        mask = len(self.keys) - 1
+        while len(pending):
+            probed = slots[pending]
+            rows = self.rows[probed]
+            hit = (self.keys[probed] == keys[pending]) & (rows >= 0)
+            found[pending[hit]] = rows[hit]
+            more = ~hit & (rows >= 0)
+            pending = pending[more]
+            slots[pending] = (probed[more] + 1) & mask
+        return found
+
+
+class Ledger:
+    # Reopening a directory restores the name and reserve of its snapshot;
+    # a name or reserve given then must match them
+    def __init__(self, name=None, reserve=None, directory=None, fsync=False, snapshot_bytes=SNAPSHOT_BYTES):
+        self.name = name or ''
+        self.reserve = int(round_cents(reserve or 0.0))
+        self.directory = directory
+        self.fsync = fsync
+        self.snapshot_bytes = snapshot_bytes
+        self.count = 0
+        self.numbers = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self.balances = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self.status = np.zeros(INITIAL_CAPACITY, dtype=np.int8)
+        self.holders = []
+        self.account_types = []
+        self.index = HashIndex()
+        self.generation = 0
+        self._log = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            if os.path.exists(os.path.join(directory, SNAPSHOT_NAME)):
+                requested_reserve = self.reserve
+                self._recover()
+                if name is not None and name != self.name:
+                    self.close_log()
+                    raise LedgerError(f"The ledger in {directory} is {self.name!r}, not {name!r}")
+                if reserve is not None and requested_reserve != self.reserve:
+                    self.close_log()
+                    raise LedgerError(f"The ledger in {directory} has a reserve of {to_amounts(self.reserve)}, "
+                                      f"not {to_amounts(requested_reserve)}")
+            else:
+                self.snapshot()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, number):
+        return self.rows([number])[0] >= 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close_log()
+
+    # Lookups
+
+    def rows(self, numbers):
+        # Row of every account number, -1 where there is no such account
+        return self.index.lookup(np.asarray(numbers, dtype=np.int64).ravel())
+
+    def _known_rows(self, numbers):
+        rows = self.rows(numbers)
+        if (rows < 0).any():
+            raise LedgerError(f"No account {int(np.asarray(numbers).ravel()[np.argmax(rows < 0)])}")
+        return rows
+
+    def balance(self, numbers):
+        return to_amounts(self.balances[self._known_rows(numbers)])
+
+    def account_status(self, numbers):
+        return [STATUS_NAMES[status] for status in self.status[self._known_rows(numbers)].tolist()]
+
+    def holder(self, number):
+        return self.holders[self._known_rows([number])[0]]
+
+    def total(self):
+        return to_amounts(int(self.balances[:self.count].sum()))
+
+    # Operations. Each one checks its batch, then logs and applies what it
+    # accepted, and returns a mask of the accepted entries.
+
+    def open_accounts(self, numbers, holders, account_types, balances=0.0):
+        numbers = np.asarray(numbers, dtype=np.int64).ravel()
+        cents = np.broadcast_to(round_cents(balances), numbers.shape)
+        holders, account_types = list(holders), list(account_types)
+        if len(holders) != len(numbers) or len(account_types) != len(numbers):
+            raise LedgerError("Every account needs a holder and an account type")
+        if len(np.unique(numbers)) != len(numbers) or (self.rows(numbers) >= 0).any():
+            raise LedgerError("Account numbers must be new and distinct")
+        if (cents < 0).any():
+            raise LedgerError("Opening balances cannot be negative")
+        self._commit(partial(self._apply_open, numbers, holders, account_types, cents),
+                     'open', numbers.tobytes(), holders, account_types, cents.tobytes())
+        return np.ones(len(numbers), dtype=bool)
+
+    def freeze(self, numbers):
+        rows = self._known_rows(numbers)
+        accepted = self.status[rows] == OPEN
+        self._set_status('freeze', rows[accepted], FROZEN)
+        return accepted
+
+    def close(self, numbers):
+        # Only an account with nothing left on it can be closed
+        rows = self._known_rows(numbers)
+        accepted = (self.status[rows] != CLOSED) & (self.balances[rows] == 0)
+        self._set_status('close', rows[accepted], CLOSED)
+        return accepted
+
+    def deposit(self, numbers, amounts):
+        rows, cents = self._batch(numbers, amounts)
+        accepted = self._usable(rows) & (cents > 0)
+        rows, cents = rows[accepted], cents[accepted]
+        self._commit(partial(np.add.at, self.balances, rows, cents),
+                     'deposit', self.numbers[rows].tobytes(), cents.tobytes())
+        return accepted
+
+    def withdraw(self, numbers, amounts):
+        rows, cents = self._batch(numbers, amounts)
+        accepted = self._covered(rows, cents, self._usable(rows) & (cents > 0))
+        accepted = self._above_reserve(cents, accepted)
+        rows, cents = rows[accepted], cents[accepted]
+        self._commit(partial(np.subtract.at, self.balances, rows, cents),
+                     'withdraw', self.numbers[rows].tobytes(), cents.tobytes())
+        return accepted
+
+    def transfer(self, sources, targets, amounts):
+        rows, cents = self._batch(sources, amounts)
+        target_rows = self.rows(targets)
+        if len(target_rows) != len(rows):
+            raise LedgerError("Every transfer needs a source, a target and an amount")
+        accepted = self._usable(rows) & self._usable(target_rows) & (rows != target_rows) & (cents > 0)
+        accepted = self._covered(rows, cents, accepted)
+        rows, target_rows, cents = rows[accepted], target_rows[accepted], cents[accepted]
+        self._commit(partial(self._apply_transfer, rows, target_rows, cents),
+                     'transfer', self.numbers[rows].tobytes(), self.numbers[target_rows].tobytes(), cents.tobytes())
+        return accepted
+
+    def _batch(self, numbers, amounts):
+        rows = self.rows(numbers)
+        cents = np.broadcast_to(round_cents(amounts), rows.shape)
+        return rows, cents
+
+    def _usable(self, rows):
+        # Known accounts that are neither frozen nor closed
+        return (rows >= 0) & (self.status[np.maximum(rows, 0)] == OPEN)
+
+    def _covered(self, rows, cents, candidates):
+        # candidates whose account's balance covers them together with the
+        # earlier candidate debits of the same account. Amounts are positive,
+        # so within an account the running total only grows and the covered
+        # debits are always the first ones.
+        accepted = np.zeros(len(rows), dtype=bool)
+        positions = np.flatnonzero(candidates)
+        if not len(positions):
+            return accepted
+        order = positions[np.argsort(rows[positions], kind='stable')]
+        sorted_rows, sorted_cents = rows[order], cents[order]
+        running = np.cumsum(sorted_cents)
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_rows[1:] != sorted_rows[:-1]
+        before = np.maximum.accumulate(np.where(first, running - sorted_cents, 0))
+        accepted[order] = running - before <= self.balances[sorted_rows]
+        return accepted
+
+    def _above_reserve(self, cents, candidates):
+        # candidates, in batch order, until paying them out would take the
+        # total of all balances below the reserve
+        paid = np.cumsum(np.where(candidates, cents, 0))
+        return candidates & (int(self.balances[:self.count].sum()) - paid >= self.reserve)
+
+    def _set_status(self, operation, rows, status):
+        self._commit(partial(self.status.__setitem__, rows, status), operation, self.numbers[rows].tobytes())
+
+    # Changes shared by the operations and log replay
+
+    def _apply_open(self, numbers, holders, account_types, cents):
+        start, end = self.count, self.count + len(numbers)
+        if end > len(self.numbers):
+            self._grow(end)
+        self.numbers[start:end] = numbers
+        self.balances[start:end] = cents
+        self.status[start:end] = OPEN
+        self.holders.extend(holders)
+        self.account_types.extend(account_types)
+        self.index.insert(np.asarray(numbers, dtype=np.int64), np.arange(start, end))
+        self.count = end
+
+    def _apply_transfer(self, rows, target_rows, cents):
+        np.subtract.at(self.balances, rows, cents)
+        np.add.at(self.balances, target_rows, cents)
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self.numbers))
+        for column in ('numbers', 'balances', 'status'):
+            old = getattr(self, column)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, column, new)
+
+    def _replay(self, operation, fields):
+        if operation == 'open':
+            numbers, holders, account_types, cents = fields
+            self._apply_open(np.frombuffer(numbers, dtype=np.int64), holders, account_types,
+                             np.frombuffer(cents, dtype=np.int64))
+            return
+        rows = self._known_rows(np.frombuffer(fields[0], dtype=np.int64))
+        if operation == 'freeze':
+            self.status[rows] = FROZEN
+        elif operation == 'close':
+            self.status[rows] = CLOSED
+        elif operation == 'deposit':
+            np.add.at(self.balances, rows, np.frombuffer(fields[1], dtype=np.int64))
+        elif operation == 'withdraw':
+            np.subtract.at(self.balances, rows, np.frombuffer(fields[1], dtype=np.int64))
+        elif operation == 'transfer':
+            self._apply_transfer(rows, self._known_rows(np.frombuffer(fields[1], dtype=np.int64)),
+                                 np.frombuffer(fields[2], dtype=np.int64))
+        else:
+            raise LedgerError(f"Unknown log record {operation!r}")
+
+    # Durability
+
+    def _commit(self, apply, operation, *fields):
+        # Apply a change, log it, then take a snapshot if the log has grown
+        # past snapshot_bytes. Applying first keeps a change that raises out
+        # of the log, where replay would apply it after all.
+        apply()
+        if self._log is None:
+            return
+        payload = marshal.dumps((operation, *fields))
+        self._log.write(LOG_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        if self._log.tell() >= self.snapshot_bytes:
+            self.snapshot()
+
+    def snapshot(self):
+        # Write the whole ledger to the snapshot file and start an empty log.
+        # The snapshot names the log that follows it, so a crash between the
+        # two steps leaves a snapshot with no log, never a log replayed twice.
+        if self.directory is None:
+            raise LedgerError("An in-memory ledger has no snapshots")
+        generation = self.generation + 1
+        count = self.count
+        with tempfile.NamedTemporaryFile('wb', dir=self.directory, suffix='.tmp', delete=False) as file:
+            np.savez(file, name=np.array(self.name), reserve=np.array(self.reserve),
+                     generation=np.array(generation), numbers=self.numbers[:count],
+                     balances=self.balances[:count], status=self.status[:count],
+                     holders=np.array(self.holders, dtype=str), account_types=np.array(self.account_types, dtype=str))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(file.name, os.path.join(self.directory, SNAPSHOT_NAME))
+        self.close_log()
+        self.generation = generation
+        self._log = open(os.path.join(self.directory, _log_name(generation)), 'ab')
+        self._remove_stale_logs()
+
+    def _recover(self):
+        with np.load(os.path.join(self.directory, SNAPSHOT_NAME)) as snapshot:
+            self.name = str(snapshot['name'])
+            self.reserve = int(snapshot['reserve'])
+            self.generation = int(snapshot['generation'])
+            self._apply_open(snapshot['numbers'], snapshot['holders'].tolist(), snapshot['account_types'].tolist(),
+                             snapshot['balances'])
+            self.status[:self.count] = snapshot['status']
+        path = os.path.join(self.directory, _log_name(self.generation))
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                log = file.read()
+            end = self._replay_log(log)
+            if end < len(log):
+                with open(path, 'r+b') as file:
+                    file.truncate(end)
+        self._log = open(path, 'ab')
+        self._remove_stale_logs()
+
+    def _replay_log(self, log):
+        # Replay the records of log up to the first torn or corrupt one and
+        # return where the good records end
+        position = 0
+        while position + LOG_HEADER.size <= len(log):
+            length, checksum = LOG_HEADER.unpack_from(log, position)
+            start = position + LOG_HEADER.size
+            payload = log[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            operation, *fields = marshal.loads(payload)
+            self._replay(operation, fields)
+            position = start + length
+        return position
+
+    def _remove_stale_logs(self):
+        current = _log_name(self.generation)
+        for name in os.listdir(self.directory):
+            if name.startswith('wal-') and name.endswith('.log') and name != current:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def sync(self):
+        if self._log is not None:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+
+    def close_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+# The ledger kaChing programs run against, replaced by bank_system. With
+# KACHING_LEDGER_DIR set, bank_system keeps each bank's ledger durably in a
+# directory named after it there.
+LEDGER_DIR = os.environ.get('KACHING_LEDGER_DIR')
+
+# Bank names become directory names, so they are kept to plain words
+BANK_NAME = re.compile(r'[A-Za-z0-9_-]+')
+
+_current = None
+
+
+def current_ledger():
+    global _current
+    if _current is None:
+        _current = Ledger()
+    return _current
+
+
+def bank_system(name, reserve):
+    global _current
+    if not isinstance(name, str) or not BANK_NAME.fullmatch(name):
+        raise LedgerError(f"Bank names may only use letters, digits, '_' and '-', not {name!r}")
+    if _current is not None:
+        _current.close_log()
+    _current = Ledger(name, reserve, os.path.join(LEDGER_DIR, name) if LEDGER_DIR else None)
+    return True
+
+
+def baccount(number, holder, account_type):
+    current_ledger().open_accounts([number], [holder], [account_type])
+    return number
+
+
+# One-record forms of the operations for the reserved words of the same name
+SCRIPT_FUNCTIONS = {
+    'bank_system': bank_system,
+    'baccount': baccount,
+    'bafreeze': lambda number: bool(current_ledger().freeze([number])[0]),
+    'baclose': lambda number: bool(current_ledger().close([number])[0]),
+    'brdeposit': lambda number, amount: bool(current_ledger().deposit([number], amount)[0]),
+    'brwithdraw': lambda number, amount: bool(current_ledger().withdraw([number], amount)[0]),
+    'brtransfer': lambda source, target, amount: bool(current_ledger().transfer([source], [target], amount)[0]),
+    'account_balance': lambda number: float(current_ledger().balance([number])[0]),
+    'account_holder': lambda number: current_ledger().holder(number),
+}
@@ -0,0 +1,223 @@
+import bisect
+import cProfile
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from functools import wraps
+
+import kaChing
+
+# Bucket upper bounds for the latency and size histograms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                bucket_labels = _labels((*self.labels, 'le'), (*label_values, str(bound)))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+PHASE_SECONDS = Histogram('kaching_phase_seconds', 'Time spent in each analysis phase.', LATENCY_BUCKETS, ('phase',))
+TOKENS_TOTAL = Counter('kaching_tokens_total', 'Tokens produced by tokenize, tokenize_line and analyze_source.',
+                       ('phase',))
+LINES_TOTAL = Counter('kaching_lines_total', 'Lines lexed by tokenize_line.')
+ANALYZED_TOTAL = Counter('kaching_analyzed_token_lists_total', 'Token lists checked by syntax_analyzer.')
+REQUEST_SECONDS = Histogram('kaching_request_seconds', 'HTTP request latency.', LATENCY_BUCKETS, ('endpoint',))
+REQUEST_BYTES = Histogram('kaching_request_bytes', 'HTTP request body size.', SIZE_BUCKETS, ('endpoint',))
+REQUESTS_TOTAL = Counter('kaching_requests_total', 'HTTP requests by endpoint and status.', ('endpoint', 'status'))
+
+METRICS = [PHASE_SECONDS, TOKENS_TOTAL, LINES_TOTAL, ANALYZED_TOTAL, REQUEST_SECONDS, REQUEST_BYTES, REQUESTS_TOTAL]
+
+# kaChing functions replaced by timed wrappers while instrumentation is on.
+# Swapping the module attributes means the functions run untouched, with no
+# flag checks, whenever it is off.
+_originals = {}
+
+
+def _timed_tokenize_line(tokenize_line):
+    @wraps(tokenize_line)
+    def wrapper(line):
+        start = time.perf_counter()
+        result = tokenize_line(line)
+        PHASE_SECONDS.observe(time.perf_counter() - start, 'tokenize_line')
+        LINES_TOTAL.inc()
+        TOKENS_TOTAL.inc(len(result[0]), 'tokenize_line')
+        return result
+    return wrapper
+
+
+def _timed_tokenize(tokenize):
+    @wraps(tokenize)
+    def wrapper(input_string, *args, **kwargs):
+        start = time.perf_counter()
+        result = tokenize(input_string, *args, **kwargs)
+        PHASE_SECONDS.observe(time.perf_counter() - start, 'tokenize')
+        TOKENS_TOTAL.inc(len(result), 'tokenize')
+        return result
+    return wrapper
+
+
+def _timed_syntax_analyzer(syntax_analyzer):
+    @wraps(syntax_analyzer)
+    def wrapper(tokens):
+        start = time.perf_counter()
+        result = syntax_analyzer(tokens)
+        PHASE_SECONDS.observe(time.perf_counter() - start, 'syntax_analyzer')
+        ANALYZED_TOTAL.inc()
+        return result
+    return wrapper
+
+
+def _timed_analyze_source(analyze_source):
+    @wraps(analyze_source)
+    def wrapper(code, budget=None):
+        start = time.perf_counter()
+        result = analyze_source(code, budget)
+        PHASE_SECONDS.observe(time.perf_counter() - start, 'analyze_source')
+        TOKENS_TOTAL.inc(len(result.tokens), 'analyze_source')
+        return result
+    return wrapper
+
+
+_WRAPPERS = {
+    'tokenize_line': _timed_tokenize_line,
+    'tokenize': _timed_tokenize,
+    'syntax_analyzer': _timed_syntax_analyzer,
+    'analyze_source': _timed_analyze_source,
+}
+
+
+def set_instrumentation(enabled):
+    # Turn the per-phase timers and counters in kaChing on or off
+    if enabled and not _originals:
+        for name, wrap in _WRAPPERS.items():
+            _originals[name] = getattr(kaChing, name)
+            setattr(kaChing, name, wrap(_originals[name]))
+    elif not enabled and _originals:
+        for name, function in _originals.items():
+            setattr(kaChing, name, function)
+        _originals.clear()
+
+
+def instrumentation_enabled():
+    return bool(_originals)
+
+
+def observe_phase(phase, seconds):
+    PHASE_SECONDS.observe(seconds, phase)
+
+
+def observe_request(endpoint, status, seconds, size):
+    REQUEST_SECONDS.observe(seconds, endpoint)
+    REQUEST_BYTES.observe(size, endpoint)
+    REQUESTS_TOTAL.inc(1, endpoint, str(status))
+
+
+def render_metrics(extra=()):
+    # All metrics in the Prometheus text exposition format
+    lines = []
+    for metric in (*METRICS, *extra):
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiler:
+    # Profiles a random sample of requests with cProfile and keeps the
+    # profiles of the slowest ones as .prof files in a directory, loadable
+    # with pstats or snakeviz. Only sampled requests pay for profiling.
+
+    def __init__(self, directory, sample_rate=0.01, keep=10):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.slowest = []  # min-heap of (seconds, sequence, path)
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        # Returns a running profiler for a sampled request, otherwise None
+        if random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def finish(self, profiler, seconds, label):
+        profiler.disable()
+        with self.lock:
+            if len(self.slowest) >= self.keep and seconds <= self.slowest[0][0]:
+                return None
+            sequence = next(self.sequence)
+            safe_label = ''.join(c if c.isalnum() else '_' for c in label).strip('_')
+            path = os.path.join(self.directory, f'{seconds * 1000:010.3f}ms-{safe_label}-{sequence}.prof')
+            profiler.dump_stats(path)
+            heapq.heappush(self.slowest, (seconds, sequence, path))
+            if len(self.slowest) > self.keep:
+                _, _, dropped = heapq.heappop(self.slowest)
+                try:
+                    os.remove(dropped)
+                except OSError:
+                    pass
+            return path
+
+    def report(self):
+        with self.lock:
+            return [{'seconds': seconds, 'path': path} for seconds, _, path in sorted(self.slowest, reverse=True)]
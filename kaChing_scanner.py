@@ -0,0 +1,350 @@
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+
+# Builds the specialized scanner behind kaChing.tokenize_line. At build time
+# the generator
+#
+#   - drops the alternatives of the lexeme pattern that can never match
+#     because an earlier catch-all (\S) always wins, and the \b anchors
+#     around \w+ that always hold when scanning left to right,
+#   - classifies every single ASCII character and every listed word with the
+#     TOKEN_TYPES patterns,
+#
+# and keeps the reduced pattern and the table of lexeme types as data, from
+# which it generates a Python module. tokenize_line then splits a line with one findall and types
+# its lexemes with a dict lookup each, both in C; lexemes missing from the
+# table are classified once by kaChing.classify_lexeme and remembered.
+#
+# The string alternatives (a quote, an unrolled body, the same quote) are the
+# only part of the lexeme pattern that can cost more than linear time: an
+# attempt at an opening quote scans to the end of the line when the string is
+# never closed, and the lexer retries at every later quote. Once a quote is
+# found unclosed, though, every later quote of the same kind on the line lies
+# inside that scan, escaped, and is unclosed too. So the generated pattern
+# also matches an unclosed string through the end of the line, and the
+# scanner then splits off the quote and scans the rest of the line once with
+# that kind of string left out. Each line is scanned at most three times,
+# whatever it holds, and the tokens are exactly those of the reference lexer.
+#
+# The tables are plain data, so they are cached on disk as JSON, in a file
+# named after a hash of the specification and GENERATOR_VERSION in a cache
+# directory that only the user can write to. A later process reads them
+# instead of reducing the pattern and classifying the table again, and a
+# changed specification gets a file of its own. The code of the scanner is
+# always generated from the template below and never read from disk.
+
+GENERATOR_VERSION = 3
+
+# Lexemes remembered beyond the precomputed table, and the longest one kept
+LEARNED_LIMIT = 1 << 16
+LEARNED_MAX_LENGTH = 64
+
+# Lines every build is checked on before it is used and cached
+PROBE_LINES = [
+    'int x = 1', 'string name = "ka\\"Ching"', "char c = 'a'", 'float rate = 12.5 # monthly',
+    'if(balance >= limit && !frozen || x != y)', 'for (i = 0; i < 10; i++) { total += i; }',
+    'print ("hello")', 'print("a", b)', '<% account_balance %>', 'x = [1, 2]; y: z',
+    '12abc _x x_1 été räte ٣ 3²', '"unterminated \\" quote', "'single' 'open", 'a+=b-=c*=d/=e%=f~=g^h',
+    '€ § \x00 \t\f', 'interest_rate rates assets kdelete', '/* not a comment here */', '#', ' # x', '',
+    '"\\"\\"\\" x', "'\\'\\' 'a' # c", '"a\\', '"open \'str\' # c', '\'open "str" # c', '"a" "b', '\\"\\\'',
+]
+
+
+def spec_hash(token_types, lexeme_regex, keywords, reserved_words):
+    spec = repr((GENERATOR_VERSION, list(token_types.items()), lexeme_regex, list(keywords), list(reserved_words)))
+    return hashlib.sha256(spec.encode()).hexdigest()
+
+
+def _classifier(token_types):
+    # The reference classification: the first TOKEN_TYPES pattern that
+    # matches the whole lexeme
+    pattern = re.compile('|'.join(f'(?P<{name}>{regex})' for name, regex in token_types.items()))
+
+    def classify(word):
+        match = pattern.fullmatch(word)
+        return 'UNKNOWN' if match is None else match.lastgroup
+    return classify
+
+
+def _top_level_alternatives(regex):
+    # Split a pattern on the '|' that are outside groups and classes
+    alternatives = []
+    depth = 0
+    in_class = False
+    start = 0
+    index = 0
+    while index < len(regex):
+        char = regex[index]
+        if char == '\\':
+            index += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+            if regex[index + 1:index + 2] == ']':
+                index += 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            alternatives.append(regex[start:index])
+            start = index + 1
+        index += 1
+    alternatives.append(regex[start:])
+    return alternatives
+
+
+def reduce_lexeme_regex(lexeme_regex):
+    # The lexeme pattern without the alternatives after the first \S, which
+    # matches any character the earlier ones did not, and with \b\w+\b as
+    # \w+. Capturing groups become non-capturing so findall returns lexemes.
+    alternatives = []
+    for alternative in _top_level_alternatives(lexeme_regex):
+        if alternative == r'\b\w+\b':
+            alternative = r'\w+'
+        alternatives.append(re.sub(r'(?<!\\)\((?!\?)', '(?:', alternative))
+        if alternative == r'\S':
+            break
+    return '|'.join(alternatives)
+
+
+# Quote delimiters of string alternatives as written in the pattern, longest
+# first, and the quote character each one matches
+QUOTE_DELIMITERS = (('\\"', '"'), ("\\'", "'"), ('"', '"'), ("'", "'"))
+
+
+def _string_quote(alternative):
+    # (quote character, delimiter) of a string alternative, else None
+    for delimiter, quote in QUOTE_DELIMITERS:
+        if len(alternative) > 2 * len(delimiter) and alternative.startswith(delimiter) \
+                and alternative.endswith(delimiter):
+            return quote, delimiter
+    return None
+
+
+def linear_scan_regexes(scan_regex):
+    # The scanning pattern with an unclosed-string alternative after each
+    # string alternative, the same pattern without the strings of each set of
+    # quotes already found unclosed (keyed by those quotes, sorted), and the
+    # pattern of a closed string for each quote
+    alternatives = _top_level_alternatives(scan_regex)
+    strings = {}
+    for alternative in alternatives:
+        found = _string_quote(alternative)
+        if found is not None:
+            quote, delimiter = found
+            strings[quote] = (alternative, alternative[:-len(delimiter)] + r'\\?\Z')
+    rest_regexes = {}
+    for size in range(len(strings) + 1):
+        for closed in itertools.combinations(sorted(strings), size):
+            parts = []
+            for alternative in alternatives:
+                found = _string_quote(alternative)
+                if found is None:
+                    parts.append(alternative)
+                elif found[0] not in closed:
+                    parts.extend(strings[found[0]])
+            rest_regexes[''.join(closed)] = '|'.join(parts)
+    closed_regexes = {quote: closed for quote, (closed, _) in strings.items()}
+    return rest_regexes.pop(''), rest_regexes, closed_regexes
+
+
+def build_tables(token_types, lexeme_regex, keywords, reserved_words):
+    # The data the scanner is generated from: its patterns and the table of
+    # lexeme types
+    classify = _classifier(token_types)
+    scan_regex, rest_regexes, closed_regexes = linear_scan_regexes(reduce_lexeme_regex(lexeme_regex))
+    if re.compile(scan_regex).groups:
+        raise ValueError(f"reduced lexeme pattern still has capturing groups: {scan_regex!r}")
+    lexemes = [chr(code) for code in range(33, 127)] + [*keywords, *reserved_words]
+    return {
+        'spec_hash': spec_hash(token_types, lexeme_regex, keywords, reserved_words),
+        'scan_regex': scan_regex,
+        'rest_regexes': rest_regexes,
+        'closed_regexes': closed_regexes,
+        'lexeme_types': {lexeme: classify(lexeme) for lexeme in lexemes},
+    }
+
+
+def _valid_tables(tables, digest):
+    # Whether tables read from disk have the shape build_tables gives them,
+    # for this specification
+    def strings(mapping):
+        return isinstance(mapping, dict) and all(isinstance(key, str) and isinstance(value, str)
+                                                  for key, value in mapping.items())
+    return (isinstance(tables, dict) and tables.get('spec_hash') == digest
+            and isinstance(tables.get('scan_regex'), str) and strings(tables.get('rest_regexes'))
+            and strings(tables.get('closed_regexes')) and strings(tables.get('lexeme_types')))
+
+
+def generate_source(tables):
+    return f'''# Generated by kaChing_scanner from the tables of one kaChing token
+# specification.
+import re
+
+SPEC_HASH = {tables['spec_hash']!r}
+
+SCAN_PATTERN = re.compile({tables['scan_regex']!r})
+
+# SCAN_PATTERN without the strings of the quotes found unclosed, keyed by
+# those quotes, and the pattern of a closed string by quote
+REST_PATTERNS = {{closed: re.compile(regex) for closed, regex in {tables['rest_regexes']!r}.items()}}
+CLOSED_STRINGS = {{quote: re.compile(regex).fullmatch for quote, regex in {tables['closed_regexes']!r}.items()}}
+QUOTES = {''.join(tables['closed_regexes'])!r}
+
+# kaChing.classify_lexeme, set by the loader
+classify_lexeme = None
+
+
+class LexemeTypes(dict):
+    # Token type by lexeme. Lexemes outside the table are classified on
+    # first sight and remembered while the table has fewer than TABLE_LIMIT
+    # entries, unless they are longer than LEARNED_MAX_LENGTH.
+    def __missing__(self, lexeme):
+        token_type = classify_lexeme(lexeme)
+        if len(self) < TABLE_LIMIT and len(lexeme) <= LEARNED_MAX_LENGTH:
+            self[lexeme] = token_type
+        return token_type
+
+
+TABLE_LIMIT = {len(tables['lexeme_types']) + LEARNED_LIMIT}
+LEARNED_MAX_LENGTH = {LEARNED_MAX_LENGTH}
+LEXEME_TYPES = LexemeTypes({tables['lexeme_types']!r})
+
+_findall = SCAN_PATTERN.findall
+_finditer = SCAN_PATTERN.finditer
+_type_of = LEXEME_TYPES.__getitem__
+
+
+def _unclosed(lexeme):
+    # Whether the last lexeme of a line is a string left open. A quote of a
+    # kind already found unclosed is a lexeme of its own.
+    return lexeme[0] in QUOTES and CLOSED_STRINGS[lexeme[0]](lexeme) is None
+
+
+def tokenize_line(line):
+    lexemes = _findall(line)
+    if lexemes and _unclosed(lexemes[-1]):
+        closed = ''
+        while lexemes and lexemes[-1][0] not in closed and _unclosed(lexemes[-1]):
+            quote = lexemes[-1][0]
+            closed = ''.join(sorted(closed + quote))
+            lexemes[-1:] = [quote, *REST_PATTERNS[closed].findall(line, len(line) - len(lexemes[-1]) + 1)]
+    comment_token = None
+    if lexemes and lexemes[-1][0] == '#':
+        comment_token = ('SINGLE_LINE_COMMENT', lexemes.pop())
+    return list(zip(map(_type_of, lexemes), lexemes)), comment_token
+
+
+def line_spans(line, offset):
+    # (token type, start, end) of the code tokens of line, shifted by offset
+    spans = []
+    append = spans.append
+    length = len(line)
+    matches = _finditer(line)
+    closed = ''
+    while True:
+        for match in matches:
+            lexeme = match.group()
+            if lexeme[0] == '#':
+                return spans
+            start, end = match.span()
+            if end == length and lexeme[0] not in closed and _unclosed(lexeme):
+                append((_type_of(lexeme[0]), offset + start, offset + start + 1))
+                closed = ''.join(sorted(closed + lexeme[0]))
+                matches = REST_PATTERNS[closed].finditer(line, start + 1)
+                break
+            append((_type_of(lexeme), offset + start, offset + end))
+        else:
+            return spans
+'''
+
+
+def _reference_tokenize_line(lexeme_pattern, classify, line):
+    code_tokens = []
+    for match in lexeme_pattern.finditer(line):
+        word = match.group()
+        if word.startswith('#'):
+            return code_tokens, ('SINGLE_LINE_COMMENT', word)
+        code_tokens.append((classify(word), word))
+    return code_tokens, None
+
+
+def mismatches(scanner, token_types, lexeme_regex, lines):
+    # Lines the scanner tokenizes differently from the reference lexer
+    lexeme_pattern = re.compile(lexeme_regex)
+    classify = _classifier(token_types)
+    for line in lines:
+        expected = _reference_tokenize_line(lexeme_pattern, classify, line)
+        if scanner.tokenize_line(line) != expected:
+            yield line, expected, scanner.tokenize_line(line)
+
+
+def _module_from_source(name, source, classify_lexeme):
+    module = type(sys)(name)
+    exec(compile(source, f'<{name}>', 'exec'), module.__dict__)
+    module.classify_lexeme = classify_lexeme
+    return module
+
+
+def _read_tables(path, digest):
+    try:
+        with open(path, encoding='utf-8') as file:
+            tables = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return tables if _valid_tables(tables, digest) else None
+
+
+def _write_tables(path, tables):
+    import tempfile
+
+    try:
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(path), suffix='.tmp',
+                                         delete=False) as file:
+            json.dump(tables, file)
+        os.replace(file.name, path)
+    except OSError:
+        return False
+    return True
+
+
+def load(cache_dir, token_types, lexeme_regex, keywords, reserved_words, classify_lexeme):
+    # The scanner for this specification, generated from the tables cached
+    # in cache_dir, or from tables built now, checked and cached there.
+    # cache_dir must be one only this user can write to; None keeps
+    # everything in memory.
+    digest = spec_hash(token_types, lexeme_regex, keywords, reserved_words)
+    name = f'kaChing_scanner_{digest[:16]}'
+    path = os.path.join(cache_dir, name + '.json') if cache_dir else None
+    tables = _read_tables(path, digest) if path else None
+    if tables is not None:
+        scanner = _module_from_source(name, generate_source(tables), classify_lexeme)
+        scanner.tables_path = path
+        return scanner
+    tables = build_tables(token_types, lexeme_regex, keywords, reserved_words)
+    scanner = _module_from_source(name, generate_source(tables), classify_lexeme)
+    failed = next(mismatches(scanner, token_types, lexeme_regex, PROBE_LINES), None)
+    if failed is not None:
+        raise RuntimeError(f"generated scanner disagrees with the reference lexer on {failed[0]!r}")
+    scanner.tables_path = path if path and _write_tables(path, tables) else None
+    return scanner
+
+
+def main(argv=None):
+    # python kaChing_scanner.py : print the source of the generated scanner
+    import kaChing
+
+    sys.stdout.write(generate_source(build_tables(kaChing.TOKEN_TYPES, kaChing.LEXEME_REGEX, kaChing.KEYWORD_LIST,
+                                                  kaChing.RESERVED_WORD_LIST)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+from flask import Flask, Response, g, request, jsonify
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+import concurrent.futures
+import os
+import time
+import uuid
+
+import kaChing
+import kaChing_encoding
+import kaChing_metrics
+from kaChing_cache import AnalysisCache, DocumentStore
+from kaChing import AnalysisBudget, AnalysisTimeout, Document, analyze_batch
+from kaChing_ast import parser_version
+
+app = Flask(__name__)
+app.config.update(
+    BATCH_WORKERS=int(os.environ.get('KACHING_BATCH_WORKERS', os.cpu_count() or 1)),
+    BATCH_CHUNK_SIZE=int(os.environ.get('KACHING_BATCH_CHUNK_SIZE', 16)),
+    BATCH_TIMEOUT=float(os.environ.get('KACHING_BATCH_TIMEOUT', 5.0)),
+    BATCH_MAX_DOCUMENTS=int(os.environ.get('KACHING_BATCH_MAX_DOCUMENTS', 10000)),
+    METRICS_ENABLED=os.environ.get('KACHING_METRICS', '0') == '1',
+    PROFILE_SAMPLE_RATE=float(os.environ.get('KACHING_PROFILE_SAMPLE_RATE', 0)),
+    PROFILE_DIR=os.environ.get('KACHING_PROFILE_DIR', 'profiles'),
+    PROFILE_KEEP=int(os.environ.get('KACHING_PROFILE_KEEP', 10)),
+    ANALYZE_CACHE_ENTRIES=int(os.environ.get('KACHING_ANALYZE_CACHE_ENTRIES', 1024)),
+    ANALYZE_CACHE_BYTES=int(os.environ.get('KACHING_ANALYZE_CACHE_BYTES', 64 << 20)),
+    ANALYZE_CACHE_TTL=float(os.environ.get('KACHING_ANALYZE_CACHE_TTL', 300.0)),
+    # Request bodies over this many bytes are refused before they are read
+    MAX_CONTENT_LENGTH=int(os.environ.get('KACHING_MAX_REQUEST_BYTES', 16 << 20)),
+    # Wall-clock and CPU seconds one /analyze request may spend analyzing
+    # (0 for no limit)
+    ANALYZE_TIME_BUDGET=float(os.environ.get('KACHING_ANALYZE_TIME_BUDGET', 10.0)),
+    ANALYZE_CPU_BUDGET=float(os.environ.get('KACHING_ANALYZE_CPU_BUDGET', 5.0)),
+    # /analyze bodies at least this large are compressed when the client
+    # accepts zstd or gzip
+    ANALYZE_COMPRESS_MIN_BYTES=int(os.environ.get('KACHING_ANALYZE_COMPRESS_MIN_BYTES', 1400)),
+    # Open /documents kept at once, and seconds an untouched one is kept
+    DOCUMENTS_MAX=int(os.environ.get('KACHING_DOCUMENTS_MAX', 1000)),
+    DOCUMENTS_TTL=float(os.environ.get('KACHING_DOCUMENTS_TTL', 3600.0)),
+)
+kaChing_metrics.set_instrumentation(app.config['METRICS_ENABLED'])
+
+# Documents opened through /documents, by id
+documents = DocumentStore(app.config['DOCUMENTS_MAX'], app.config['DOCUMENTS_TTL'])
+
+# Process pool shared by /analyze/batch, created on first use
+batch_executor = None
+
+# Encoded /analyze responses, with the content encoding applied to them, by
+# content hash and variant
+analyze_cache = AnalysisCache(app.config['ANALYZE_CACHE_ENTRIES'], app.config['ANALYZE_CACHE_BYTES'],
+                              app.config['ANALYZE_CACHE_TTL'], sizeof=lambda entry: len(entry[0]))
+
+
+# Profiles of the slowest sampled requests, created on first use when
+# PROFILE_SAMPLE_RATE is set
+slow_request_profiler = None
+
+
+def get_slow_request_profiler():
+    global slow_request_profiler
+    if slow_request_profiler is None and app.config['PROFILE_SAMPLE_RATE'] > 0:
+        slow_request_profiler = kaChing_metrics.SlowRequestProfiler(
+            app.config['PROFILE_DIR'], app.config['PROFILE_SAMPLE_RATE'], app.config['PROFILE_KEEP'])
+    return slow_request_profiler
+
+
+@app.before_request
+def start_request_metrics():
+    if not kaChing_metrics.instrumentation_enabled():
+        return
+    g.request_start = time.perf_counter()
+    profiler = get_slow_request_profiler()
+    g.profiler = profiler.start() if profiler is not None else None
+
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_start' not in g:
+        return response
+    seconds = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or 'unknown'
+    kaChing_metrics.observe_request(endpoint, response.status_code, seconds, request.content_length or 0)
+    if g.profiler is not None:
+        slow_request_profiler.finish(g.profiler, seconds, f'{request.method} {request.path}')
+    return response
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    return jsonify({'error': f"Request body is larger than {app.config['MAX_CONTENT_LENGTH']} bytes",
+                    'reason': 'size_budget', 'limit': app.config['MAX_CONTENT_LENGTH']}), 413
+
+
+@app.errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify({'error': error.description, 'reason': 'bad_request'}), 400
+
+
+def request_object():
+    # The JSON object of the request body; anything else is a 400
+    body = request.get_json()
+    if not isinstance(body, dict):
+        raise BadRequest("The request body must be a JSON object")
+    return body
+
+
+def require_string(value, name):
+    if not isinstance(value, str):
+        raise BadRequest(f"{name} must be a string")
+    return value
+
+
+def timed_jsonify(payload):
+    if not kaChing_metrics.instrumentation_enabled():
+        return jsonify(payload)
+    start = time.perf_counter()
+    response = jsonify(payload)
+    kaChing_metrics.observe_phase('jsonify', time.perf_counter() - start)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text exposition of the analysis and request metrics
+    return Response(kaChing_metrics.render_metrics(extra=[analyze_cache]), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/metrics/slowest', methods=['GET'])
+def slowest_requests():
+    profiler = get_slow_request_profiler()
+    return jsonify({'profiles': profiler.report() if profiler is not None else []})
+
+
+def get_batch_executor():
+    global batch_executor
+    if batch_executor is None:
+        batch_executor = concurrent.futures.ProcessPoolExecutor(max_workers=app.config['BATCH_WORKERS'])
+    return batch_executor
+
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(analyze_cache.stats())
+
+
+def encode_analysis(code, budget=None, media_type=kaChing_encoding.JSON_MEDIA_TYPE, encoding=None):
+    # Looked up on the module at call time, so the metrics wrappers that
+    # set_instrumentation installs there are the ones called
+    analysis = kaChing.analyze_source(code, budget)
+    start = time.perf_counter()
+    body = kaChing_encoding.encode(analysis, media_type)
+    if encoding is not None and len(body) >= app.config['ANALYZE_COMPRESS_MIN_BYTES']:
+        body = kaChing_encoding.compress(body, encoding)
+    else:
+        encoding = None
+    if kaChing_metrics.instrumentation_enabled():
+        kaChing_metrics.observe_phase('jsonify', time.perf_counter() - start)
+    return body, encoding
+
+
+@app.route('/analyze', methods=['POST'])
+def analyze_code():
+    # Get the code from the POST request
+    code = require_string(request_object().get('code', ''), "'code'")
+
+    # The body is row JSON unless the Accept header picks the columnar JSON
+    # or MessagePack form, compressed when Accept-Encoding allows it
+    offered = kaChing_encoding.media_types()
+    media_type = request.accept_mimetypes.best_match(offered) if request.accept_mimetypes else offered[0]
+    if media_type is None:
+        return jsonify({'error': f"Cannot answer with any of {request.headers.get('Accept')}",
+                        'accepted': offered}), 406
+    encoding = request.accept_encodings.best_match(kaChing_encoding.content_encodings())
+
+    # The response depends only on the code, the parser and the chosen
+    # encodings, so the code's hash, the parser version and the variant
+    # double as the ETag, and a matching If-None-Match is answered without
+    # analyzing anything. Identical requests in flight at the same time
+    # share one analysis.
+    variant = kaChing_encoding.variant(media_type, encoding)
+    key = analyze_cache.key(code)
+    etag = analyze_cache.etag(key, variant, parser_version()[:12])
+    headers = {'ETag': etag, 'Vary': 'Accept, Accept-Encoding'}
+    if request.if_none_match.contains_weak(etag.strip('"')):
+        return Response(status=304, headers=headers)
+    # Requests coalesced onto this analysis share its outcome, a time budget
+    # error included
+    budget = AnalysisBudget(app.config['ANALYZE_TIME_BUDGET'], app.config['ANALYZE_CPU_BUDGET'])
+    try:
+        body, applied = analyze_cache.get_or_compute(
+            f'{key}-{variant}' if variant else key, lambda: encode_analysis(code, budget, media_type, encoding))
+    except AnalysisTimeout as error:
+        return jsonify({'error': str(error), 'reason': 'time_budget',
+                        'limit': {'seconds': budget.seconds, 'cpuSeconds': budget.cpu_seconds}}), 422
+    if applied is not None:
+        headers['Content-Encoding'] = applied
+    return Response(body, mimetype=media_type, headers=headers)
+
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch_code():
+    # Analyze {'documents': [code or {'id', 'code'}, ...]} across the worker
+    # pool. Results come back in request order with the same fields as /analyze.
+    body = request_object()
+    batch = body.get('documents', [])
+    if not isinstance(batch, list):
+        raise BadRequest("'documents' must be a list")
+    if len(batch) > app.config['BATCH_MAX_DOCUMENTS']:
+        return jsonify({'error': f"At most {app.config['BATCH_MAX_DOCUMENTS']} documents per batch"}), 413
+    codes = [require_string(document.get('code', '') if isinstance(document, dict) else document,
+                            f"The code of document {index}") for index, document in enumerate(batch)]
+    # A client may ask for a shorter per-document timeout, never a longer one
+    # or none at all
+    timeout = body.get('timeout', app.config['BATCH_TIMEOUT'])
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not timeout > 0:
+        raise BadRequest("'timeout' must be a positive number of seconds")
+    timeout = min(timeout, app.config['BATCH_TIMEOUT'])
+    results = analyze_batch(codes, get_batch_executor(), app.config['BATCH_CHUNK_SIZE'], timeout)
+    for document, result in zip(batch, results):
+        if isinstance(document, dict) and 'id' in document:
+            result['id'] = document['id']
+    return timed_jsonify({'results': results})
+
+
+def document_results(document, start, stop):
+    return [{'line': i, 'code': document.lines[i], 'result': document.results[i]} for i in range(start, stop)]
+
+
+@app.route('/documents', methods=['POST'])
+def open_document():
+    document = Document(require_string(request_object().get('code', ''), "'code'"))
+    document_id = uuid.uuid4().hex
+    documents.add(document_id, document)
+    return jsonify({'id': document_id, 'results': document_results(document, 0, len(document))})
+
+
+@app.route('/documents/<document_id>/edits', methods=['POST'])
+def edit_document(document_id):
+    # Apply range edits ({'start': {'line', 'character'}, 'end': {...}, 'text'})
+    # in order and return the lines each one re-analyzed. The edits go to a
+    # copy that replaces the document only once all of them applied, so a
+    # bad edit leaves the document as it was.
+    document = documents.get(document_id)
+    if document is None:
+        return jsonify({'error': f"Unknown document '{document_id}'"}), 404
+    edits = request_object().get('edits', [])
+    if not isinstance(edits, list):
+        raise BadRequest("'edits' must be a list")
+    document = document.copy()
+    changes = []
+    for edit in edits:
+        try:
+            start, end = edit['start'], edit['end']
+            first, stop = document.edit(start['line'], start['character'], end['line'], end['character'],
+                                        edit.get('text', ''))
+        except (IndexError, KeyError, TypeError, ValueError) as error:
+            return jsonify({'error': f"Invalid edit {len(changes)}: {error}"}), 400
+        changes.append({'lineCount': len(document), 'results': document_results(document, first, stop)})
+    if not documents.replace(document_id, document):
+        return jsonify({'error': f"Unknown document '{document_id}'"}), 404
+    return jsonify({'id': document_id, 'changes': changes})
+
+
+@app.route('/documents/<document_id>', methods=['DELETE'])
+def close_document(document_id):
+    if documents.pop(document_id) is None:
+        return jsonify({'error': f"Unknown document '{document_id}'"}), 404
+    return '', 204
+
+
+if __name__ == '__main__':
+    app.run(debug=True)
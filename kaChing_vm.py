@@ -0,0 +1,910 @@
+import math
+import sys
+import time
+from array import array
+
+from kaChing import analyze_source
+
+# Compiles kaChing programs to bytecode and runs them on a stack machine.
+#
+#   program = compile_program(code)
+#   run_program(program, max_steps=10_000_000, timeout=5.0)
+#
+# The compiler reads the tokens of analyze_source, so it sees exactly what
+# the analyzer sees; adjacent one-character operators are joined back into
+# '+=', '==', '&&', '++' and friends, and 'INT . INT' into a float literal.
+# A statement ends at ';' or at the end of its line. Variables are resolved
+# to numbered slots at compile time, so the machine never looks names up.
+
+# Opcodes. Every instruction is two words: the opcode and its argument.
+CONST, LOAD, STORE, POP = 0, 1, 2, 3
+ADD, SUB, MUL, DIV, MOD, POW, CONCAT = 4, 5, 6, 7, 8, 9, 10
+LT, LE, GT, GE, EQ, NE = 11, 12, 13, 14, 15, 16
+NOT, NEG, TO_INT, TO_FLOAT, TO_BOOL = 17, 18, 19, 20, 21
+JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, LOOP = 22, 23, 24, 25, 26
+PRINT, CALL, HALT = 27, 28, 29
+# Superinstructions for the commonest loop shapes:
+#   ADD_SLOT_CONST  slots[a] += constants[b]      (x++, x--, x += 1)
+#   LOAD_LOAD       push slots[a], then slots[b]  (the operands of a binary op)
+#   CMP_JUMP        compare the two top values and jump to b when false
+ADD_SLOT_CONST, LOAD_LOAD, CMP_JUMP = 30, 31, 32
+
+OPCODE_NAMES = {value: name for name, value in globals().items() if name.isupper() and isinstance(value, int)}
+
+# Argument packing for instructions with two operands: the first in the
+# low PACK_SHIFT bits, the second above them. Code is an array of signed
+# 32-bit words, so the second operand stays below PACK_HIGH_LIMIT.
+PACK_SHIFT = 20
+PACK_MASK = (1 << PACK_SHIFT) - 1
+PACK_HIGH_LIMIT = 1 << (31 - PACK_SHIFT)
+
+# Static types of values and the declaration keywords that give them
+TYPE_OF_DECLARATION = {'int': 'int', 'long': 'int', 'float': 'float', 'double': 'float', 'string': 'string',
+                       'char': 'string', 'bool': 'bool'}
+NUMERIC = ('int', 'float')
+
+# The one-character operator tokens the lexer produces, joined back when
+# they touch
+JOINED_OPERATORS = {'+=', '-=', '*=', '/=', '%=', '^=', '==', '!=', '<=', '>=', '&&', '||', '++', '--'}
+
+BINARY_OPCODES = {'+': ADD, '-': SUB, '*': MUL, '/': DIV, '%': MOD, '^': POW,
+                  '<': LT, '<=': LE, '>': GT, '>=': GE, '==': EQ, '!=': NE}
+COMPOUND_ASSIGNMENTS = {'+=': '+', '-=': '-', '*=': '*', '/=': '/', '%=': '%', '^=': '^'}
+
+
+def _finance(name):
+    # A built-in evaluated by the batched kaChing_finance function of the same
+    # name on a single record; numpy is only imported on the first call
+    def call(*arguments):
+        import kaChing_finance
+        return float(kaChing_finance.RESERVED_WORD_FUNCTIONS[name](*arguments))
+    return call
+
+
+def _ledger(name):
+    # A banking built-in, run against kaChing_ledger's current ledger
+    def call(*arguments):
+        import kaChing_ledger
+        return kaChing_ledger.SCRIPT_FUNCTIONS[name](*arguments)
+    return call
+
+
+# Functions callable from kaChing: name -> (function, parameter count,
+# result type). run_program takes its own table to add or replace entries.
+BUILTINS = {
+    'simple_interest': (_finance('simple_interest'), 3, 'float'),
+    'compound_interest': (_finance('compound_interest'), 3, 'float'),
+    'return_on_investment': (_finance('return_on_investment'), 2, 'float'),
+    'installment_amount': (_finance('installment_amount'), 3, 'float'),
+    'total_payment': (_finance('total_payment'), 3, 'float'),
+    'taxes': (_finance('taxes'), 1, 'float'),
+    'deductions': (_finance('deductions'), 2, 'float'),
+    'net_pay': (_finance('net_pay'), 2, 'float'),
+    'bank_system': (_ledger('bank_system'), 2, 'bool'),
+    'baccount': (_ledger('baccount'), 3, 'int'),
+    'bafreeze': (_ledger('bafreeze'), 1, 'bool'),
+    'baclose': (_ledger('baclose'), 1, 'bool'),
+    'brdeposit': (_ledger('brdeposit'), 2, 'bool'),
+    'brwithdraw': (_ledger('brwithdraw'), 2, 'bool'),
+    'brtransfer': (_ledger('brtransfer'), 3, 'bool'),
+    'account_balance': (_ledger('account_balance'), 1, 'float'),
+    'account_holder': (_ledger('account_holder'), 1, 'string'),
+}
+
+
+def packable(first, second):
+    return 0 <= first <= PACK_MASK and 0 <= second < PACK_HIGH_LIMIT
+
+
+class CompileError(Exception):
+    def __init__(self, message, line=None):
+        super().__init__(message if line is None else f"line {line}: {message}")
+        self.line = line
+
+
+class VMError(Exception):
+    def __init__(self, message, line=None):
+        super().__init__(message if line is None else f"line {line}: {message}")
+        self.line = line
+
+
+class StepBudgetExceeded(VMError):
+    pass
+
+
+class Program:
+    # Compiled bytecode: two words per instruction, the constants they refer
+    # to, the source line of each instruction and the name of each slot
+    __slots__ = ('code', 'constants', 'lines', 'slot_names', 'slot_types', 'functions')
+
+    def __init__(self, code, constants, lines, slot_names, slot_types, functions):
+        self.code = code
+        self.constants = constants
+        self.lines = lines
+        self.slot_names = slot_names
+        self.slot_types = slot_types
+        self.functions = functions
+
+    def disassemble(self):
+        rows = []
+        for pc in range(0, len(self.code), 2):
+            op, arg = self.code[pc], self.code[pc + 1]
+            name = OPCODE_NAMES[op]
+            if op == CONST:
+                detail = repr(self.constants[arg])
+            elif op in (LOAD, STORE):
+                detail = self.slot_names[arg]
+            elif op == ADD_SLOT_CONST:
+                detail = f"{self.slot_names[arg & PACK_MASK]} += {self.constants[arg >> PACK_SHIFT]!r}"
+            elif op == LOAD_LOAD:
+                detail = f"{self.slot_names[arg & PACK_MASK]}, {self.slot_names[arg >> PACK_SHIFT]}"
+            elif op == CMP_JUMP:
+                detail = f"{OPCODE_NAMES[arg >> PACK_SHIFT]} else {arg & PACK_MASK}"
+            elif op == CALL:
+                detail = f"{self.functions[arg >> 8]}/{arg & 0xFF}"
+            else:
+                detail = str(arg)
+            rows.append(f"{pc:6} {self.lines[pc // 2]:5}  {name:20} {detail}")
+        return '\n'.join(rows)
+
+
+def _unescape(text):
+    # Body of a quoted literal with its backslash escapes resolved
+    if '\\' not in text:
+        return text
+    escapes = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0'}
+    out = []
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char == '\\' and index + 1 < len(text):
+            index += 1
+            out.append(escapes.get(text[index], text[index]))
+        else:
+            out.append(char)
+        index += 1
+    return ''.join(out)
+
+
+def program_tokens(code):
+    # The analyzer's tokens as (kind, text, line, column), kind being one of
+    # NUMBER, STRING, NAME, KEYWORD, OP or EOF. Comments are dropped.
+    analysis = analyze_source(code)
+    stream = analysis.tokens
+    tokens = []
+    index = 0
+    count = len(stream)
+    while index < count:
+        token_type = stream.type_at(index)
+        text = stream.lexeme_at(index)
+        start, end = stream.starts[index], stream.ends[index]
+        line, column = analysis.token_lines[index], analysis.token_columns[index]
+        index += 1
+        if token_type == 'MULTI_LINE_COMMENT':
+            continue
+        # Join touching one-character operators and 'INT . INT' literals
+        if index < count and stream.starts[index] == end:
+            joined = text + stream.lexeme_at(index)
+            if joined in JOINED_OPERATORS:
+                index += 1
+                tokens.append(('OP', joined, line, column))
+                continue
+            if (token_type == 'INT_LITERAL' and joined == text + '.' and index + 1 < count
+                    and stream.starts[index + 1] == end + 1 and stream.type_at(index + 1) == 'INT_LITERAL'):
+                tokens.append(('NUMBER', float(text + '.' + stream.lexeme_at(index + 1)), line, column))
+                index += 2
+                continue
+        if token_type == 'INT_LITERAL':
+            tokens.append(('NUMBER', int(text), line, column))
+        elif token_type == 'STRING_LITERAL' or (token_type == 'UNKNOWN' and len(text) >= 2
+                                                  and text[0] == text[-1] == "'"):
+            tokens.append(('STRING', _unescape(text[1:-1]), line, column))
+        elif token_type == 'KEYWORDS':
+            tokens.append(('KEYWORD', text, line, column))
+        elif token_type in ('IDENTIFIER', 'RESERVEDWORDS'):
+            tokens.append(('NAME', text, line, column))
+        elif token_type in ('UNKNOWN', 'ERROR') and text not in ('&', '|'):
+            raise CompileError(f"Unexpected character {text!r}", line)
+        else:
+            tokens.append(('OP', text, line, column))
+    last_line = len(analysis.lines)
+    tokens.append(('EOF', '', last_line + 1, 1))
+    return tokens
+
+
+class Compiler:
+    # Recursive descent over program_tokens, emitting bytecode directly
+
+    def __init__(self, tokens, builtins):
+        self.tokens = tokens
+        self.position = 0
+        self.builtins = builtins
+        self.code = []
+        self.lines = []
+        self.constants = []
+        self.constant_index = {}
+        self.slot_names = []
+        self.slot_types = []
+        self.scopes = [{}]
+        self.functions = []
+        self.jump_targets = set()
+        self.loops = []  # [continue target or None, [break jumps], [continue jumps]]
+
+    # Token helpers
+
+    def peek(self, offset=0):
+        return self.tokens[min(self.position + offset, len(self.tokens) - 1)]
+
+    def advance(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def at(self, kind, text=None):
+        token = self.tokens[self.position]
+        return token[0] == kind and (text is None or token[1] == text)
+
+    def at_op(self, text):
+        token = self.tokens[self.position]
+        return token[0] == 'OP' and token[1] == text
+
+    def same_line_op(self, texts):
+        # An operator that continues the expression: on the line of the
+        # token before it, so a line break ends the statement
+        token = self.tokens[self.position]
+        return token[0] == 'OP' and token[1] in texts and token[2] == self.tokens[self.position - 1][2]
+
+    def expect_op(self, text):
+        token = self.advance()
+        if token[0] != 'OP' or token[1] != text:
+            raise CompileError(f"Expected '{text}' but found {self.describe(token)}", token[2])
+        return token
+
+    def describe(self, token):
+        return 'the end of the program' if token[0] == 'EOF' else repr(str(token[1]))
+
+    def end_statement(self):
+        token = self.peek()
+        if token[0] == 'OP' and token[1] == ';':
+            self.advance()
+        elif not (token[0] == 'EOF' or token[1] in ('}', 'else', 'elif')
+                  or token[2] > self.tokens[self.position - 1][2]):
+            raise CompileError(f"Expected ';' or a new line before {self.describe(token)}", token[2])
+
+    # Emission helpers
+
+    def emit(self, op, arg=0, line=None):
+        self.code.append(op)
+        self.code.append(arg)
+        self.lines.append(line if line is not None else self.tokens[max(self.position - 1, 0)][2])
+        return len(self.code) - 2
+
+    def patch(self, at, target=None):
+        target = len(self.code) if target is None else target
+        self.code[at + 1] = target
+        self.jump_targets.add(target)
+
+    def constant(self, value):
+        key = (type(value), value)
+        index = self.constant_index.get(key)
+        if index is None:
+            index = self.constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def declare(self, name, value_type, line):
+        if name in self.scopes[-1]:
+            raise CompileError(f"'{name}' is already declared in this block", line)
+        slot = len(self.slot_names)
+        self.slot_names.append(name)
+        self.slot_types.append(value_type)
+        self.scopes[-1][name] = slot
+        return slot
+
+    def resolve(self, name, line):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        raise CompileError(f"'{name}' is not declared", line)
+
+    def convert(self, from_type, to_type, line):
+        # Emit the conversion a value of from_type needs to be stored as to_type
+        if from_type == to_type:
+            return
+        if to_type == 'int' and from_type == 'float':
+            self.emit(TO_INT, 0, line)
+        elif to_type == 'float' and from_type == 'int':
+            self.emit(TO_FLOAT, 0, line)
+        elif to_type == 'bool':
+            self.emit(TO_BOOL, 0, line)
+        else:
+            raise CompileError(f"Cannot use {from_type} value as {to_type}", line)
+
+    # Statements
+
+    def compile(self):
+        while not self.at('EOF'):
+            self.statement()
+        self.emit(HALT)
+        return Program(array('i', self.code), self.constants, array('I', self.lines), self.slot_names,
+                       self.slot_types, self.functions)
+
+    def statement(self):
+        token = self.peek()
+        kind, text, line = token[0], token[1], token[2]
+        if kind == 'OP' and text == '{':
+            self.block()
+        elif kind == 'OP' and text == ';':
+            self.advance()
+        elif kind == 'KEYWORD' and text in TYPE_OF_DECLARATION:
+            self.declaration()
+            self.end_statement()
+        elif kind == 'KEYWORD' and text == 'if':
+            self.if_statement()
+        elif kind == 'KEYWORD' and text == 'while':
+            self.while_statement()
+        elif kind == 'KEYWORD' and text == 'for':
+            self.for_statement()
+        elif kind == 'KEYWORD' and text == 'print':
+            self.print_statement()
+            self.end_statement()
+        elif kind == 'KEYWORD' and text in ('break', 'continue'):
+            self.advance()
+            if not self.loops:
+                raise CompileError(f"'{text}' outside a loop", line)
+            self.loops[-1][1 if text == 'break' else 2].append(self.emit(JUMP, 0, line))
+            self.end_statement()
+        elif kind in ('NAME', 'OP'):
+            self.simple_statement()
+            self.end_statement()
+        else:
+            raise CompileError(f"Unexpected {self.describe(token)}", line)
+
+    def block(self):
+        self.expect_op('{')
+        self.scopes.append({})
+        while not self.at_op('}'):
+            if self.at('EOF'):
+                raise CompileError("Missing '}' at the end of the program", self.peek()[2])
+            self.statement()
+        self.advance()
+        self.scopes.pop()
+
+    def declaration(self):
+        keyword = self.advance()
+        value_type = TYPE_OF_DECLARATION[keyword[1]]
+        while True:
+            name = self.advance()
+            if name[0] != 'NAME':
+                raise CompileError(f"Expected a name after '{keyword[1]}'", name[2])
+            if self.at_op('='):
+                self.advance()
+                self.convert(self.expression(), value_type, name[2])
+            else:
+                self.emit(CONST, self.constant({'int': 0, 'float': 0.0, 'string': '', 'bool': False}[value_type]),
+                          name[2])
+            self.emit(STORE, self.declare(name[1], value_type, name[2]), name[2])
+            if not self.at_op(','):
+                return
+            self.advance()
+
+    def simple_statement(self):
+        # Assignment, increment or an expression evaluated for its effect
+        token = self.peek()
+        if token[0] == 'OP' and token[1] in ('++', '--'):
+            self.advance()
+            name = self.advance()
+            if name[0] != 'NAME':
+                raise CompileError(f"Expected a name after '{token[1]}'", token[2])
+            self.increment(name, 1 if token[1] == '++' else -1)
+            return
+        following = self.peek(1)
+        if token[0] == 'NAME' and following[0] == 'OP' and following[2] == token[2]:
+            if following[1] == '=':
+                self.position += 2
+                slot = self.resolve(token[1], token[2])
+                self.convert(self.expression(), self.slot_types[slot], token[2])
+                self.emit(STORE, slot, token[2])
+                return
+            if following[1] in COMPOUND_ASSIGNMENTS:
+                self.position += 2
+                slot = self.resolve(token[1], token[2])
+                slot_type = self.slot_types[slot]
+                value, after = self.peek(), self.peek(1)
+                if (following[1] in ('+=', '-=') and value[0] == 'NUMBER' and value[2] == token[2]
+                        and slot_type in NUMERIC and (slot_type == 'float' or isinstance(value[1], int))
+                        and (after[0] == 'EOF' or after[2] != value[2] or after[1] in (';', ')', '}'))):
+                    # x += number needs no conversion: one instruction
+                    self.advance()
+                    self.add_slot_const(slot, value[1] if following[1] == '+=' else -value[1], token[2])
+                    return
+                self.emit(LOAD, slot, token[2])
+                start = len(self.code)
+                value_type = self.expression()
+                result_type = self.binary_op(COMPOUND_ASSIGNMENTS[following[1]], slot_type, value_type, start,
+                                             token[2])
+                self.convert(result_type, slot_type, token[2])
+                self.emit(STORE, slot, token[2])
+                return
+            if following[1] in ('++', '--'):
+                self.position += 2
+                self.increment(token, 1 if following[1] == '++' else -1)
+                return
+        self.expression()
+        self.emit(POP)
+
+    def increment(self, name, step):
+        slot = self.resolve(name[1], name[2])
+        if self.slot_types[slot] not in NUMERIC:
+            raise CompileError(f"Cannot increment the {self.slot_types[slot]} '{name[1]}'", name[2])
+        self.add_slot_const(slot, step, name[2])
+
+    def add_slot_const(self, slot, step, line):
+        # One instruction while slot and constant fit the packed argument,
+        # the plain load, add and store otherwise
+        constant = self.constant(step)
+        if packable(slot, constant):
+            self.emit(ADD_SLOT_CONST, slot | constant << PACK_SHIFT, line)
+            return
+        self.emit(LOAD, slot, line)
+        self.emit(CONST, constant, line)
+        self.emit(ADD, 0, line)
+        self.emit(STORE, slot, line)
+
+    def convert_condition(self, value_type):
+        if value_type != 'bool':
+            self.emit(TO_BOOL)
+        # Fold a trailing comparison into the conditional jump, unless a
+        # jump lands right after it
+        if (len(self.code) >= 2 and self.code[-2] in (LT, LE, GT, GE, EQ, NE)
+                and len(self.code) not in self.jump_targets):
+            compare = self.code[-2]
+            del self.code[-2:], self.lines[-1]
+            return self.emit(CMP_JUMP, compare << PACK_SHIFT)
+        return self.emit(JUMP_IF_FALSE)
+
+    def patch_condition(self, at, target=None):
+        target = len(self.code) if target is None else target
+        self.jump_targets.add(target)
+        if self.code[at] == CMP_JUMP:
+            if target > PACK_MASK:
+                raise CompileError(f"Program too large: a condition jumps past code word {PACK_MASK}",
+                                   self.lines[at // 2])
+            self.code[at + 1] = (self.code[at + 1] & ~PACK_MASK) | target
+        else:
+            self.code[at + 1] = target
+
+    def if_statement(self):
+        exits = []
+        self.advance()
+        self.expect_op('(')
+        skip = self.convert_condition(self.expression())
+        self.expect_op(')')
+        self.body()
+        while self.at('KEYWORD', 'elif') or self.at('KEYWORD', 'else'):
+            exits.append(self.emit(JUMP))
+            self.patch_condition(skip)
+            if self.advance()[1] == 'elif':
+                self.expect_op('(')
+                skip = self.convert_condition(self.expression())
+                self.expect_op(')')
+                self.body()
+            else:
+                skip = None
+                self.body()
+                break
+        if skip is not None:
+            self.patch_condition(skip)
+        for at in exits:
+            self.patch(at)
+
+    def body(self):
+        # The statement governed by if, else, while or for, in its own scope
+        self.scopes.append({})
+        self.statement()
+        self.scopes.pop()
+
+    def loop_body(self, continue_target):
+        self.loops.append([continue_target, [], []])
+        self.body()
+        return self.loops.pop()
+
+    def while_statement(self):
+        self.advance()
+        start = len(self.code)
+        self.expect_op('(')
+        exit_jump = self.convert_condition(self.expression())
+        self.expect_op(')')
+        _, breaks, continues = self.loop_body(start)
+        self.emit(LOOP, start)
+        self.patch_condition(exit_jump)
+        for at in breaks:
+            self.patch(at)
+        for at in continues:
+            # A backward jump, so it counts against the step budget too
+            self.code[at] = LOOP
+            self.patch(at, start)
+
+    def for_statement(self):
+        line = self.advance()[2]
+        self.expect_op('(')
+        self.scopes.append({})
+        if not self.at_op(';'):
+            if self.at('KEYWORD') and self.peek()[1] in TYPE_OF_DECLARATION:
+                self.declaration()
+            else:
+                self.simple_statement()
+        self.expect_op(';')
+        start = len(self.code)
+        exit_jump = None
+        if not self.at_op(';'):
+            exit_jump = self.convert_condition(self.expression())
+        self.expect_op(';')
+        # The step runs after the body: skip its tokens now, come back to
+        # them once the body is compiled
+        step_position = self.position
+        depth = 0
+        while depth or not self.at_op(')'):
+            token = self.advance()
+            if token[0] == 'EOF':
+                raise CompileError("Missing closing parenthesis ')' in 'for' loop", line)
+            if token[0] == 'OP' and token[1] in ('(', ')'):
+                depth += 1 if token[1] == '(' else -1
+        self.advance()
+        _, breaks, continues = self.loop_body(None)
+        body_end = self.position
+        step_target = len(self.code)
+        self.position = step_position
+        if not self.at_op(')'):
+            self.simple_statement()
+        self.expect_op(')')
+        self.position = body_end
+        self.emit(LOOP, start)
+        if exit_jump is not None:
+            self.patch_condition(exit_jump)
+        for at in breaks:
+            self.patch(at)
+        for at in continues:
+            self.patch(at, step_target)
+        self.scopes.pop()
+
+    def print_statement(self):
+        line = self.advance()[2]
+        self.expect_op('(')
+        count = 0
+        if not self.at_op(')'):
+            while True:
+                self.expression()
+                count += 1
+                if not self.at_op(','):
+                    break
+                self.advance()
+        self.expect_op(')')
+        self.emit(PRINT, count, line)
+
+    # Expressions return their static type
+
+    def expression(self):
+        return self.logical_or()
+
+    def logical(self, operators, jump, operand):
+        value_type = operand()
+        while self.same_line_op(operators) or (self.at('KEYWORD') and self.peek()[1] in operators):
+            line = self.advance()[2]
+            if value_type != 'bool':
+                self.emit(TO_BOOL, 0, line)
+            at = self.emit(jump, 0, line)
+            if operand() != 'bool':
+                self.emit(TO_BOOL, 0, line)
+            self.patch(at)
+            value_type = 'bool'
+        return value_type
+
+    def logical_or(self):
+        return self.logical(('||', 'or'), JUMP_IF_TRUE_OR_POP, self.logical_and)
+
+    def logical_and(self):
+        return self.logical(('&&', 'and'), JUMP_IF_FALSE_OR_POP, self.equality)
+
+    def binary(self, operators, operand):
+        value_type = operand()
+        while self.same_line_op(operators):
+            operator = self.advance()
+            start = len(self.code)
+            right_type = operand()
+            value_type = self.binary_op(operator[1], value_type, right_type, start, operator[2])
+        return value_type
+
+    def equality(self):
+        return self.binary(('==', '!='), self.relational)
+
+    def relational(self):
+        return self.binary(('<', '<=', '>', '>='), self.additive)
+
+    def additive(self):
+        return self.binary(('+', '-'), self.multiplicative)
+
+    def multiplicative(self):
+        return self.binary(('*', '/', '%'), self.unary)
+
+    def binary_type(self, operator, left, right, line):
+        if operator in ('==', '!='):
+            if (left in NUMERIC) != (right in NUMERIC) or (left not in NUMERIC and left != right):
+                raise CompileError(f"Cannot compare {left} with {right}", line)
+            return 'bool'
+        if operator in ('<', '<=', '>', '>='):
+            if not (left in NUMERIC and right in NUMERIC or left == right == 'string'):
+                raise CompileError(f"Cannot order {left} and {right}", line)
+            return 'bool'
+        if operator == '+' and 'string' in (left, right):
+            return 'string'
+        if left not in NUMERIC or right not in NUMERIC:
+            raise CompileError(f"Unsupported operands for '{operator}': {left} and {right}", line)
+        if operator in ('/', '^'):
+            return 'float'
+        return 'int' if left == right == 'int' else 'float'
+
+    def binary_op(self, operator, left, right, right_start, line):
+        result = self.binary_type(operator, left, right, line)
+        if result == 'string':
+            self.emit(CONCAT, 0, line)
+            return result
+        # Two loads in a row become one instruction, unless a jump lands
+        # between them, as the short-circuit jump of '(a || b) == c' lands on
+        # the load of c
+        if (right_start >= 2 and len(self.code) == right_start + 2 and self.code[right_start] == LOAD
+                and self.code[right_start - 2] == LOAD and right_start not in self.jump_targets
+                and packable(self.code[right_start - 1], self.code[right_start + 1])):
+            first, second = self.code[right_start - 1], self.code[right_start + 1]
+            del self.code[right_start - 2:], self.lines[right_start // 2 - 1:]
+            self.emit(LOAD_LOAD, first | second << PACK_SHIFT, line)
+        self.emit(BINARY_OPCODES[operator], 0, line)
+        return result
+
+    def unary(self):
+        if self.at_op('-') or self.at_op('!') or self.at('KEYWORD', 'not') or self.at_op('+'):
+            operator = self.advance()
+            value_type = self.unary()
+            if operator[1] in ('!', 'not'):
+                if value_type != 'bool':
+                    self.emit(TO_BOOL, 0, operator[2])
+                self.emit(NOT, 0, operator[2])
+                return 'bool'
+            if value_type not in NUMERIC:
+                raise CompileError(f"Unary '{operator[1]}' needs a number, not {value_type}", operator[2])
+            if operator[1] == '-':
+                self.emit(NEG, 0, operator[2])
+            return value_type
+        return self.power()
+
+    def power(self):
+        # '^' raises to a power and groups to the right
+        value_type = self.primary()
+        if self.same_line_op(('^',)):
+            operator = self.advance()
+            start = len(self.code)
+            right_type = self.unary()
+            return self.binary_op('^', value_type, right_type, start, operator[2])
+        return value_type
+
+    def primary(self):
+        token = self.advance()
+        kind, text, line = token[0], token[1], token[2]
+        if kind == 'NUMBER':
+            self.emit(CONST, self.constant(text), line)
+            return 'int' if isinstance(text, int) else 'float'
+        if kind == 'STRING':
+            self.emit(CONST, self.constant(text), line)
+            return 'string'
+        if kind == 'KEYWORD' and text in ('true', 'false'):
+            self.emit(CONST, self.constant(text == 'true'), line)
+            return 'bool'
+        if kind == 'OP' and text == '(':
+            value_type = self.expression()
+            self.expect_op(')')
+            return value_type
+        if kind == 'NAME':
+            if self.at_op('(') and self.peek()[2] == line:
+                return self.call(token)
+            self.emit(LOAD, self.resolve(text, line), line)
+            return self.slot_types[self.resolve(text, line)]
+        raise CompileError(f"Expected a value but found {self.describe(token)}", line)
+
+    def call(self, name):
+        entry = self.builtins.get(name[1])
+        if entry is None:
+            raise CompileError(f"Unknown function '{name[1]}'", name[2])
+        _, arity, result_type = entry
+        self.expect_op('(')
+        count = 0
+        if not self.at_op(')'):
+            while True:
+                self.expression()
+                count += 1
+                if not self.at_op(','):
+                    break
+                self.advance()
+        self.expect_op(')')
+        if count != arity:
+            raise CompileError(f"'{name[1]}' takes {arity} arguments, not {count}", name[2])
+        if name[1] not in self.functions:
+            self.functions.append(name[1])
+        self.emit(CALL, self.functions.index(name[1]) << 8 | count, name[2])
+        return result_type
+
+
+def compile_program(code, builtins=None):
+    # Bytecode for a kaChing program; raises CompileError with the line
+    return Compiler(program_tokens(code), BUILTINS if builtins is None else builtins).compile()
+
+
+def format_value(value):
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return str(value)
+
+
+# Backward jumps between checks of the wall-clock timeout
+TIMEOUT_CHECK_INTERVAL = 4096
+
+
+def run_program(program, output=None, max_steps=None, timeout=None, builtins=None):
+    # Run a Program. Each printed line is passed to output (default: written
+    # to stdout). max_steps bounds the number of loop iterations (backward
+    # jumps), the only way a program runs longer than its own length, and
+    # timeout bounds the run in seconds; exceeding either raises
+    # StepBudgetExceeded. Returns the final value of every slot.
+    if output is None:
+        def output(text):
+            sys.stdout.write(text + '\n')
+    table = BUILTINS if builtins is None else builtins
+    functions = [table[name][0] for name in program.functions]
+    code = program.code.tolist()
+    constants = program.constants
+    slots = [None] * len(program.slot_names)
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    steps_left = max_steps if max_steps is not None else -1
+    deadline = time.perf_counter() + timeout if timeout is not None else None
+    until_clock_check = TIMEOUT_CHECK_INTERVAL
+    pc = 0
+    try:
+        while True:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+            if op == LOAD:
+                push(slots[arg])
+            elif op == CONST:
+                push(constants[arg])
+            elif op == LOAD_LOAD:
+                push(slots[arg & PACK_MASK])
+                push(slots[arg >> PACK_SHIFT])
+            elif op == STORE:
+                slots[arg] = pop()
+            elif op == CMP_JUMP:
+                right = pop()
+                left = pop()
+                compare = arg >> PACK_SHIFT
+                if compare == LT:
+                    passed = left < right
+                elif compare == LE:
+                    passed = left <= right
+                elif compare == GT:
+                    passed = left > right
+                elif compare == GE:
+                    passed = left >= right
+                elif compare == EQ:
+                    passed = left == right
+                else:
+                    passed = left != right
+                if not passed:
+                    pc = arg & PACK_MASK
+            elif op == ADD_SLOT_CONST:
+                slot = arg & PACK_MASK
+                slots[slot] = slots[slot] + constants[arg >> PACK_SHIFT]
+            elif op == ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif op == MUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif op == SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif op == DIV:
+                right = pop()
+                stack[-1] = stack[-1] / right
+            elif op == LOOP:
+                if steps_left > 0:
+                    steps_left -= 1
+                elif steps_left == 0:
+                    raise StepBudgetExceeded(f"Step budget of {max_steps} loop iterations exhausted")
+                if deadline is not None:
+                    until_clock_check -= 1
+                    if not until_clock_check:
+                        until_clock_check = TIMEOUT_CHECK_INTERVAL
+                        if time.perf_counter() > deadline:
+                            raise StepBudgetExceeded(f"Program ran longer than {timeout} seconds")
+                pc = arg
+            elif op == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == MOD:
+                right = pop()
+                stack[-1] = stack[-1] % right
+            elif op == POW:
+                right = pop()
+                stack[-1] = math.pow(stack[-1], right)
+            elif op == CONCAT:
+                right = pop()
+                stack[-1] = format_value(stack[-1]) + format_value(right)
+            elif op in (LT, LE, GT, GE, EQ, NE):
+                right = pop()
+                left = stack[-1]
+                if op == LT:
+                    stack[-1] = left < right
+                elif op == LE:
+                    stack[-1] = left <= right
+                elif op == GT:
+                    stack[-1] = left > right
+                elif op == GE:
+                    stack[-1] = left >= right
+                elif op == EQ:
+                    stack[-1] = left == right
+                else:
+                    stack[-1] = left != right
+            elif op == JUMP_IF_FALSE_OR_POP:
+                if stack[-1]:
+                    pop()
+                else:
+                    pc = arg
+            elif op == JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    pc = arg
+                else:
+                    pop()
+            elif op == NOT:
+                stack[-1] = not stack[-1]
+            elif op == NEG:
+                stack[-1] = -stack[-1]
+            elif op == TO_INT:
+                stack[-1] = int(stack[-1])
+            elif op == TO_FLOAT:
+                stack[-1] = float(stack[-1])
+            elif op == TO_BOOL:
+                stack[-1] = bool(stack[-1])
+            elif op == POP:
+                pop()
+            elif op == PRINT:
+                values = stack[len(stack) - arg:] if arg else []
+                del stack[len(stack) - arg:]
+                output(' '.join(map(format_value, values)))
+            elif op == CALL:
+                count = arg & 0xFF
+                arguments = stack[len(stack) - count:] if count else []
+                del stack[len(stack) - count:]
+                push(functions[arg >> 8](*arguments))
+            elif op == HALT:
+                return slots
+            else:
+                raise VMError(f"Unknown opcode {op}")
+    except VMError as error:
+        if error.line is None:
+            error = type(error)(str(error), program.lines[pc // 2 - 1])
+        raise error from None
+    except ZeroDivisionError:
+        raise VMError("Division by zero", program.lines[pc // 2 - 1]) from None
+    except (ArithmeticError, TypeError, ValueError) as error:
+        raise VMError(f"{type(error).__name__}: {error}", program.lines[pc // 2 - 1]) from None
+    except IndexError:
+        raise VMError("Stack underflow", program.lines[pc // 2 - 1]) from None
+
+
+def run_source(code, output=None, max_steps=None, timeout=None, builtins=None):
+    return run_program(compile_program(code, builtins), output, max_steps, timeout, builtins)